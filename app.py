@@ -5,6 +5,11 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from db_routing import RoutingSession, init_replicas
+from rate_limit import RateLimitMiddleware, default_storage
+from metrics import InstrumentedQueuePool, init_metrics, default_directory as default_metrics_directory
+from sqlite_profile import init_sqlite, is_sqlite_uri, sqlite_engine_options
+from log_config import configure_logging, init_request_ids
 
 # Load environment variables from .env file
 try:
@@ -14,14 +19,14 @@ except ImportError:
     # dotenv not available, that's okay
     pass
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (queued JSON lines by default, see log_config.py)
+configure_logging()
 
 class Base(DeclarativeBase):
     pass
 
 # Initialize extensions
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 
 def create_app():
@@ -31,22 +36,75 @@ def create_app():
     # Configuration
     app.secret_key = os.environ.get("SESSION_SECRET") or "7cf7427f7116d526e973cd9ff2cdfa2ce27e28a2ad405edc0c01d3231515ffa5"
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///portfolio.db")
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        "pool_recycle": 300,
-        "pool_pre_ping": True,
-    }
+    
+    # SQLite gets its own profile (WAL, pragmas, serialized writes) unless SQLITE_PROFILE=0
+    app.config['SQLITE_PROFILE_ENABLED'] = (
+        is_sqlite_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+        and os.environ.get("SQLITE_PROFILE", "1") != "0"
+    )
+    if app.config['SQLITE_PROFILE_ENABLED']:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_engine_options()
+    else:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            "pool_recycle": 300,
+            "pool_pre_ping": True,
+        }
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # Optional read replicas (comma-separated URLs) for read-only requests
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [
+        url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+    ]
+    app.config['SQLALCHEMY_REPLICA_ENGINE_OPTIONS'] = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get("REPLICA_STICKY_SECONDS", 5))
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", 10))
+    app.config['VIEW_FLUSH_INTERVAL'] = float(os.environ.get("VIEW_FLUSH_INTERVAL", 10))
+    app.config['VIEW_DEDUP_WINDOW'] = float(os.environ.get("VIEW_DEDUP_WINDOW", 1800))
     app.config['UPLOAD_FOLDER'] = 'uploads'
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Budgets checked from the image header before anything is decoded
+    app.config['IMAGE_MAX_BYTES'] = app.config['MAX_CONTENT_LENGTH']
+    app.config['IMAGE_MAX_PIXELS'] = int(os.environ.get("IMAGE_MAX_PIXELS", 50_000_000))
+    app.config['IMAGE_MAX_DECODE_BYTES'] = int(os.environ.get("IMAGE_MAX_DECODE_MB", 128)) * 1024 * 1024
+    app.config['UPLOAD_CHUNK_SIZE'] = 4 * 1024 * 1024  # Chunked uploads stay under MAX_CONTENT_LENGTH per request
+    app.config['MAX_CHUNKED_UPLOAD_SIZE'] = int(os.environ.get("MAX_VIDEO_UPLOAD_MB", 1024)) * 1024 * 1024
+    # Directory of pre-rendered public pages kept up to date after writes (see freeze.py)
+    app.config['FREEZE_OUTPUT'] = os.environ.get("FREEZE_OUTPUT")
+    app.config['FREEZE_BASE_URL'] = os.environ.get("FREEZE_BASE_URL")
+    app.config['FREEZE_DELAY'] = float(os.environ.get("FREEZE_DELAY", 2))
+    # Pre-rendered sitemap and Atom feed (see feeds.py); SITE_URL is used for their absolute links
+    app.config['FEEDS_DIR'] = os.environ.get("FEEDS_DIR")
+    app.config['FEEDS_DELAY'] = float(os.environ.get("FEEDS_DELAY", 1))
+    app.config['SITE_URL'] = os.environ.get("SITE_URL")
+    # Seconds before a worker rebuilds its suggestion index to pick up new likes and views
+    app.config['SUGGEST_MAX_AGE'] = float(os.environ.get("SUGGEST_MAX_AGE", 600))
     
     # Ensure upload folder exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
-    # WSGI middleware for proxy headers
-    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    # Rate limiting for write endpoints ("memory" = per worker, "shared" = all workers on the host)
+    app.config['RATELIMIT_ENABLED'] = os.environ.get("RATELIMIT_ENABLED", "1") != "0"
+    ratelimit_storage = os.environ.get("RATELIMIT_STORAGE", "shared")
+    app.config['RATELIMIT_STORAGE'] = default_storage(app) if ratelimit_storage == "shared" else ratelimit_storage
+    
+    # WSGI middleware: throttling runs inside ProxyFix so it sees the real client IP
+    app.wsgi_app = ProxyFix(RateLimitMiddleware(app, app.wsgi_app), x_proto=1, x_host=1)
+    
+    # Prometheus metrics, aggregated over the workers through files in METRICS_DIR
+    app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "1") != "0"
+    app.config['METRICS_DIR'] = os.environ.get("METRICS_DIR") or default_metrics_directory(app)
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+    app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN")
+    if app.config['METRICS_ENABLED']:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+                                                       poolclass=InstrumentedQueuePool)
     
     # Initialize extensions
     db.init_app(app)
+    init_sqlite(app, db)
+    init_replicas(app)
+    init_metrics(app, db)
+    init_request_ids(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Por favor, faça login para acessar esta página.'
@@ -78,7 +136,7 @@ def create_app():
             )
             db.session.add(admin)
             db.session.commit()
-            logging.info(f"Admin user created: {admin_email}")
+            logging.info("Admin user created: %s", admin_email)
     
     # Context processor for global template variables
     @app.context_processor
@@ -89,10 +147,37 @@ def create_app():
         }
     
     # Register blueprints
-    from routes import main_bp, auth_bp, admin_bp
+    from routes import main_bp, auth_bp, admin_bp, api_bp
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+    
+    # Write-behind project view counter
+    from view_tracking import init_view_tracking
+    init_view_tracking(app)
+    
+    # Static pre-rendering of public pages
+    from freeze import init_freeze
+    init_freeze(app)
+    
+    # Sitemap and Atom feed
+    from feeds import init_feeds
+    init_feeds(app)
+    
+    # Search box suggestions
+    from suggest import init_suggest
+    init_suggest(app)
+    
+    # CLI commands
+    from content_transfer import content_cli
+    from upload_gc import uploads_cli
+    from freeze import freeze_cli
+    from schema_migrations import schema_cli
+    app.cli.add_command(content_cli)
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(freeze_cli)
+    app.cli.add_command(schema_cli)
     
     return app
 
@@ -0,0 +1,114 @@
+"""
+Image ingest memory/time benchmark
+
+Processes generated JPEG and PNG uploads of several sizes, each in a fresh
+subprocess, and reports the peak RSS growth and wall time of the previous
+approach (save, reopen, thumbnail) and of utils.ingest_image.
+
+Usage: python benchmarks/image_ingest.py [--sizes 2,12,40]
+"""
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def legacy_ingest(source, file_path, max_size=(1200, 1200)):
+    """The pre-budget code path: write the upload, reopen it and thumbnail it"""
+    from PIL import Image
+    with open(file_path, 'wb') as f:
+        f.write(source.read())
+    with Image.open(file_path) as img:
+        if img.mode == 'RGBA' and file_path.endswith(('.jpg', '.jpeg')):
+            rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+            rgb_img.paste(img, mask=img.split()[-1])
+            img = rgb_img
+        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        img.save(file_path, optimize=True, quality=85)
+
+
+def peak_rss_kb():
+    """High-water RSS of this process; VmHWM, unlike ru_maxrss, is not inherited from the parent"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(mode, path):
+    """Run one ingest and print 'peak_kb seconds status'"""
+    from PIL import Image
+    from utils import ingest_image
+
+    with open(path, 'rb') as f:
+        source = io.BytesIO(f.read())
+    Image.init()
+    baseline = peak_rss_kb()
+
+    ext = os.path.splitext(path)[1]
+    out = tempfile.NamedTemporaryFile(suffix=ext, delete=False).name
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        if mode == 'legacy':
+            legacy_ingest(source, out)
+        else:
+            ingest_image(source, out)
+    except Exception as e:
+        status = f'rejected ({type(e).__name__})'
+    elapsed = time.perf_counter() - start
+    os.remove(out)
+
+    peak = peak_rss_kb() - baseline
+    print(peak, elapsed, status)
+
+
+def make_image(directory, megapixels, fmt):
+    from PIL import Image
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    # A gradient compresses like a photo would not, but decodes to the same buffer size
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    path = os.path.join(directory, f'{megapixels}mp.{fmt.lower()}')
+    img.save(path, fmt, quality=90) if fmt == 'JPEG' else img.save(path, fmt)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='2,12,40', help='Comma-separated megapixel sizes')
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{'image':>12} {'approach':>8} {'peak RSS':>10} {'time':>9}  result")
+    with tempfile.TemporaryDirectory() as tmp:
+        for megapixels in [int(size) for size in args.sizes.split(',')]:
+            for fmt in ('JPEG', 'PNG'):
+                path = make_image(tmp, megapixels, fmt)
+                for mode in ('legacy', 'ingest'):
+                    output = subprocess.run(
+                        [sys.executable, __file__, '--child', mode, path],
+                        capture_output=True, text=True, check=True, cwd=ROOT,
+                    ).stdout.split(maxsplit=2)
+                    peak_kb, elapsed, status = int(output[0]), float(output[1]), output[2].strip()
+                    print(f"{os.path.basename(path):>12} {mode:>8} {peak_kb / 1024:8.1f}MB "
+                          f"{elapsed * 1000:7.0f}ms  {status}")
+
+
+if __name__ == '__main__':
+    main()
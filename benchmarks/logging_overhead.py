@@ -0,0 +1,97 @@
+"""
+Logging overhead benchmark
+
+Serves project pages through the test client with the previous setup
+(synchronous text at DEBUG, as logging.basicConfig(level=DEBUG) did) and with
+the queued JSON pipeline from log_config.py, each in a fresh subprocess with
+stderr going to a file. Reports the time per request, the records written per
+request and the cost of one logger.info call on the request thread.
+
+Usage: python benchmarks/logging_overhead.py [--requests 2000] [--calls 50000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'before (text, DEBUG)': {'LOG_FORMAT': 'text', 'LOG_LEVEL': 'DEBUG'},
+    'after (queued JSON, INFO)': {'LOG_FORMAT': 'json', 'LOG_LEVEL': 'INFO'},
+    'after (queued JSON, DEBUG)': {'LOG_FORMAT': 'json', 'LOG_LEVEL': 'DEBUG'},
+}
+
+
+def run(requests, calls):
+    """Runs in the subprocess; prints a JSON result on stdout"""
+    import logging
+    from app import app, db
+    from models import Project
+    app.config['RATELIMIT_ENABLED'] = False
+    with app.app_context():
+        db.session.add(Project(title='Benchmark', description='Benchmark', is_published=True))
+        db.session.commit()
+
+    client = app.test_client()
+    client.get('/project/1').get_data()
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/project/1').get_data()
+    per_request = (time.perf_counter() - start) / requests
+
+    # Everything logged so far has reached the file once the handlers are flushed
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+    with open(os.environ['BENCH_LOG']) as f:
+        records = sum(1 for _ in f) / (requests + 1)
+
+    # Best of five batches, to keep scheduler noise out of a number this small
+    with app.test_request_context('/'):
+        logger = app.logger
+        batch = calls // 5
+        per_call = float('inf')
+        for _ in range(5):
+            start = time.perf_counter()
+            for i in range(batch):
+                logger.info("Benchmark record %d for %s", i, 'project')
+            per_call = min(per_call, (time.perf_counter() - start) / batch)
+
+    print(json.dumps({'per_request': per_request, 'per_call': per_call, 'records': records}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--calls', type=int, default=50000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.requests, args.calls)
+        return
+
+    for mode, env in MODES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, 'stderr.log')
+            # A queue large enough for the logger.info loop, so no record is dropped
+            child_env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/bench.db", METRICS_ENABLED='0',
+                             RATELIMIT_STORAGE='memory', LOG_QUEUE_SIZE=str(args.calls * 2),
+                             BENCH_LOG=log_path, **env)
+            with open(log_path, 'w') as stderr:
+                output = subprocess.run(
+                    [sys.executable, __file__, '--child', '--requests', str(args.requests), '--calls', str(args.calls)],
+                    env=child_env, stdout=subprocess.PIPE, stderr=stderr, check=True, text=True,
+                ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:28} {result['per_request'] * 1000:7.3f} ms/request  "
+              f"{result['records']:6.1f} records/request  "
+              f"{result['per_call'] * 1e6:6.2f} µs per logger.info on the request thread")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Metrics recording overhead benchmark
+
+Times Metrics.inc and Metrics.observe in a tight loop, the full per-request
+cost of MetricsMiddleware around a trivial WSGI app, and a scrape merging the
+files of several simulated workers.
+
+Usage: python benchmarks/metrics_overhead.py [--iterations 200000] [--workers 8]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def per_call(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--iterations', type=int, default=200_000)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    from flask import Flask
+    from metrics import Metrics, MetricsMiddleware
+
+    directory = tempfile.mkdtemp(prefix='metrics-bench-')
+    app = Flask(__name__)
+    metrics = Metrics(app, directory, flush_interval=3600)
+    labels = (('endpoint', 'main.project_detail'), ('method', 'GET'))
+
+    print(f"inc:      {per_call(lambda: metrics.inc('http_requests_total', labels), args.iterations):.2f} µs")
+    print(f"observe:  {per_call(lambda: metrics.observe('http_request_duration_seconds', 0.012, labels), args.iterations):.2f} µs")
+
+    def bare_app(environ, start_response):
+        start_response('200 OK', [('Content-Length', '2')])
+        return [b'ok']
+
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/project/7', 'SERVER_NAME': 'localhost',
+               'SERVER_PORT': '80', 'wsgi.url_scheme': 'http', 'portfolio.endpoint': 'main.project_detail'}
+    start_response = lambda status, headers, exc_info=None: None
+
+    def request(wsgi):
+        body = wsgi(environ, start_response)
+        for _ in body:
+            pass
+        if hasattr(body, 'close'):
+            body.close()
+
+    middleware = MetricsMiddleware(app, bare_app, metrics)
+    bare = per_call(lambda: request(bare_app), args.iterations // 10)
+    wrapped = per_call(lambda: request(middleware), args.iterations // 10)
+    print(f"request:  {wrapped - bare:.2f} µs added by MetricsMiddleware")
+
+    # Scrape with the files of several live workers (sleeping processes stand in for them)
+    snapshot = metrics.snapshot()
+    workers = [subprocess.Popen(['sleep', '600']) for _ in range(args.workers - 1)]
+    try:
+        for worker in workers:
+            with open(os.path.join(directory, f"{worker.pid}.json"), 'w') as f:
+                json.dump(snapshot, f)
+        print(f"scrape:   {per_call(metrics.collect, 200) / 1000:.2f} ms with {args.workers} workers")
+    finally:
+        for worker in workers:
+            worker.kill()
+
+
+if __name__ == '__main__':
+    main()
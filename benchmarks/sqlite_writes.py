@@ -0,0 +1,127 @@
+"""
+SQLite write throughput benchmark
+
+Simulates several gunicorn workers toggling likes concurrently against one SQLite
+file, with the stock settings and with the SQLite profile from sqlite_profile.py.
+
+Usage: python benchmarks/sqlite_writes.py [--workers 4] [--threads 4] [--seconds 5]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_app(db_path, profile):
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ['SQLITE_PROFILE'] = '1' if profile else '0'
+    logging.disable(logging.WARNING)
+    from app import app, db
+    return app, db
+
+
+def setup(db_path, users):
+    from werkzeug.security import generate_password_hash
+    app, db = load_app(db_path, profile=True)
+    from models import User, Project
+    with app.app_context():
+        db.session.add(Project(title='Benchmark', description='Benchmark', is_published=True))
+        for i in range(users):
+            db.session.add(User(name=f'User {i}', email=f'user{i}@example.com',
+                                password_hash=generate_password_hash('x', method='pbkdf2:sha256:1')))
+        db.session.commit()
+
+
+def worker(db_path, profile, user_ids, seconds, results):
+    app, db = load_app(db_path, profile)
+    from models import Like, Project
+    from sqlite_profile import serialized_write
+
+    project_id = 1
+
+    @serialized_write
+    def toggle_like(user_id):
+        # Same read-then-write shape as routes.toggle_like
+        Project.query.get(project_id)
+        like = Like.query.filter_by(user_id=user_id, project_id=project_id).first()
+        if like:
+            db.session.delete(like)
+        else:
+            db.session.add(Like(user_id=user_id, project_id=project_id))
+        db.session.commit()
+
+    counts = {'ok': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def run(user_id):
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            with app.test_request_context(method='POST'):
+                try:
+                    toggle_like(user_id)
+                    key = 'ok'
+                except Exception:
+                    db.session.rollback()
+                    key = 'locked'
+                finally:
+                    db.session.remove()
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=run, args=(uid,)) for uid in user_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put(counts)
+
+
+def run_case(profile, workers, threads, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        ctx = multiprocessing.get_context('spawn')
+
+        setup_proc = ctx.Process(target=setup, args=(db_path, workers * threads))
+        setup_proc.start()
+        setup_proc.join()
+
+        results = ctx.Queue()
+        procs = []
+        for w in range(workers):
+            user_ids = range(w * threads + 2, (w + 1) * threads + 2)  # id 1 is the admin
+            procs.append(ctx.Process(target=worker, args=(db_path, profile, list(user_ids), seconds, results)))
+        for p in procs:
+            p.start()
+        totals = {'ok': 0, 'locked': 0}
+        for _ in procs:
+            counts = results.get()
+            totals['ok'] += counts['ok']
+            totals['locked'] += counts['locked']
+        for p in procs:
+            p.join()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.threads} threads, {args.seconds}s per case")
+    for label, profile in (('stock', False), ('sqlite profile', True)):
+        totals = run_case(profile, args.workers, args.threads, args.seconds)
+        print(f"{label:>15}: {totals['ok'] / args.seconds:8.1f} writes/sec, "
+              f"{totals['locked']} failed with 'database is locked'")
+
+
+if __name__ == '__main__':
+    main()
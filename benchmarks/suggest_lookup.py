@@ -0,0 +1,68 @@
+"""
+Suggestion index benchmark
+
+Fills a SuggestIndex with synthetic projects (three-word titles, one of a few
+hundred tags each) and times lookups by prefix length, a single-project update
+as done after an admin save, and building the index from the rows the startup
+query returns.
+
+Usage: python benchmarks/suggest_lookup.py [--projects 20000] [--lookups 5000]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def per_call(function, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--projects', type=int, default=20_000)
+    parser.add_argument('--lookups', type=int, default=5000)
+    args = parser.parse_args()
+
+    # Importing suggest creates the app; the index itself is filled in memory below
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp(prefix='suggest-bench-')}/bench.db")
+    os.environ.setdefault('METRICS_ENABLED', '0')
+    os.environ.setdefault('RATELIMIT_STORAGE', 'memory')
+    import app  # noqa: F401  (create the app before importing its modules)
+    from suggest import SuggestIndex, _popularity
+
+    rng = random.Random(42)
+    word = lambda: ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+    projects = {
+        project_id: (' '.join(word() for _ in range(3)), None, {f'tag{project_id % 300}'},
+                     _popularity(rng.randint(0, 50), rng.randint(0, 10_000), False))
+        for project_id in range(args.projects)
+    }
+
+    start = time.perf_counter()
+    index = SuggestIndex.from_projects(projects, {})
+    print(f"build:    {args.projects} projects, {len(index.keys)} keys in {time.perf_counter() - start:.2f} s")
+
+    prefixes = [word() for _ in range(200)]
+    for length in (1, 2, 3, 5):
+        queries = [prefix[:length] for prefix in prefixes]
+        cycle = iter(queries * (args.lookups // len(queries) + 1))
+        print(f"lookup:   {per_call(lambda: index.search(next(cycle)), args.lookups):.1f} µs "
+              f"for {length}-character prefixes")
+
+    ids = iter(rng.sample(range(args.projects), 200))
+    update = lambda: index.update_project(next(ids), (' '.join(word() for _ in range(3)), None, {'tag7'}, 3.0))
+    print(f"update:   {per_call(update, 200) / 1000:.2f} ms per project saved")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, select, update
+from app import db
+from freeze import track_project_changes
+from models import Project
+from utils import delete_file
+
+# Bulk actions on projects and the columns they set (see BulkProjectForm)
+UPDATE_ACTIONS = {
+    'publish': {'is_published': True},
+    'unpublish': {'is_published': False},
+    'feature': {'is_featured': True},
+    'unfeature': {'is_featured': False},
+}
+DELETE_ACTION = 'delete'
+
+
+def dependent_tables():
+    """Tables whose rows are deleted along with their project (ON DELETE CASCADE)"""
+    projects = Project.__table__
+    return [table for table in db.metadata.sorted_tables
+            if any(fk.column.table is projects and fk.ondelete == 'CASCADE' for fk in table.foreign_keys)]
+
+
+def update_projects(project_ids, values):
+    """Set columns on many projects with one UPDATE; the caller commits"""
+    if not project_ids:
+        return 0
+    track_project_changes(db.session, project_ids)
+    statement = (update(Project)
+                 .where(Project.id.in_(project_ids))
+                 .values(**values, updated_at=datetime.utcnow())
+                 .execution_options(synchronize_session=False, project_ids=tuple(project_ids)))
+    return db.session.execute(statement).rowcount
+
+
+def delete_projects(project_ids):
+    """
+    Delete many projects with set-based statements; the caller commits
+
+    Likes, comments, tags and view totals go with them through ON DELETE CASCADE
+    instead of being loaded by the ORM. SQLite does not enforce foreign keys here
+    (and cannot add the cascade to an existing table), so on SQLite the dependent
+    rows are deleted explicitly in the same transaction. Returns the number of
+    projects deleted and the uploaded files they referenced, to be removed once
+    the deletion is committed.
+    """
+    if not project_ids:
+        return 0, []
+    rows = db.session.execute(
+        select(Project.image_url, Project.video_url).where(Project.id.in_(project_ids))
+    ).all()
+    files = [filename for row in rows for filename in row if filename]
+
+    # Listings and tags are read before the rows are gone
+    track_project_changes(db.session, project_ids, deleted=True)
+    if db.engine.dialect.name == 'sqlite':
+        for table in dependent_tables():
+            db.session.execute(delete(table).where(table.c.project_id.in_(project_ids)))
+    db.session.execute(delete(Project).where(Project.id.in_(project_ids))
+                       .execution_options(synchronize_session=False, project_ids=tuple(project_ids)))
+    return len(rows), files
+
+
+def apply_action(action, project_ids):
+    """Run a bulk action in one transaction; returns the number of projects affected"""
+    project_ids = list(project_ids)
+    if action == DELETE_ACTION:
+        count, files = delete_projects(project_ids)
+        db.session.commit()
+        remove_files_later(files)
+        return count
+
+    count = update_projects(project_ids, UPDATE_ACTIONS[action])
+    db.session.commit()
+    return count
+
+
+def _remove_files(app, filenames):
+    with app.app_context():
+        removed = sum(1 for filename in filenames if delete_file(filename))
+        app.logger.info("Removed %d of %d files of deleted projects", removed, len(filenames))
+
+
+def remove_files_later(filenames):
+    """Delete uploaded files in a background thread so the request does not wait on the disk"""
+    if not filenames:
+        return None
+    thread = threading.Thread(target=_remove_files, name='file-remover', daemon=True,
+                              args=(current_app._get_current_object(), list(filenames)))
+    thread.start()
+    return thread
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from flask import current_app
+from werkzeug.utils import secure_filename
+from metrics import observe
+
+# Chunked upload sessions live in <upload folder>/.chunked/<upload id>/:
+#   meta.json    filename, size, chunk size, optional sha256, final filename once complete
+#   data         the file being assembled, written in place at each chunk's offset
+#   chunks/<n>   marker written after chunk n arrived with a matching checksum and was written
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+READ_BLOCK_SIZE = 64 * 1024
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'webm'}
+
+
+def _upload_root():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+
+def _session_dir(upload_id):
+    if not upload_id or not UPLOAD_ID_PATTERN.match(upload_id):
+        return None
+    path = os.path.join(_upload_root(), '.chunked', upload_id)
+    return path if os.path.isdir(path) else None
+
+
+def _read_meta(session_dir):
+    with open(os.path.join(session_dir, 'meta.json')) as f:
+        return json.load(f)
+
+
+def _write_meta(session_dir, meta):
+    # Write then rename so readers in other workers never see a partial file
+    tmp_path = os.path.join(session_dir, f"meta.json.tmp.{os.getpid()}")
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(session_dir, 'meta.json'))
+
+
+def _chunk_count(meta):
+    return max(1, -(-meta['size'] // meta['chunk_size']))
+
+
+def _received_chunks(session_dir):
+    return sorted(int(name) for name in os.listdir(os.path.join(session_dir, 'chunks')))
+
+
+def create_upload(filename, size, sha256=None):
+    """Start a chunked upload session and return its status"""
+    filename = secure_filename(filename or '')
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if ext not in VIDEO_EXTENSIONS:
+        raise ValueError('Apenas vídeos!')
+
+    max_size = current_app.config['MAX_CHUNKED_UPLOAD_SIZE']
+    if not isinstance(size, int) or size <= 0 or size > max_size:
+        raise ValueError(f'O arquivo deve ter entre 1 byte e {max_size // (1024 * 1024)} MB.')
+
+    upload_id = uuid.uuid4().hex
+    session_dir = os.path.join(_upload_root(), '.chunked', upload_id)
+    os.makedirs(os.path.join(session_dir, 'chunks'))
+
+    # Sparse file of the final size; chunks are written at their offsets
+    with open(os.path.join(session_dir, 'data'), 'wb') as f:
+        f.truncate(size)
+
+    meta = {
+        'filename': filename,
+        'ext': ext,
+        'size': size,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
+        'sha256': sha256,
+        'completed_filename': None,
+    }
+    _write_meta(session_dir, meta)
+    return get_upload_status(upload_id)
+
+
+def get_upload_status(upload_id):
+    """Return the status of an upload session (for resuming), or None if unknown"""
+    session_dir = _session_dir(upload_id)
+    if session_dir is None:
+        return None
+
+    meta = _read_meta(session_dir)
+    return {
+        'upload_id': upload_id,
+        'filename': meta['filename'],
+        'size': meta['size'],
+        'chunk_size': meta['chunk_size'],
+        'chunk_count': _chunk_count(meta),
+        'received': _received_chunks(session_dir),
+        'completed': meta['completed_filename'] is not None,
+    }
+
+
+def write_chunk(upload_id, index, stream, checksum):
+    """
+    Stream one chunk from the request body into place
+
+    The body is copied in small blocks to a temporary file in the session
+    directory while its SHA-256 is computed; only a chunk whose digest matches
+    ``checksum`` is copied into the data file, so a bad re-send never
+    overwrites a chunk that was already accepted. A rejected chunk is simply
+    sent again.
+    """
+    session_dir = _session_dir(upload_id)
+    if session_dir is None:
+        raise LookupError('Upload não encontrado.')
+
+    meta = _read_meta(session_dir)
+    if meta['completed_filename'] is not None:
+        raise ValueError('Upload já concluído.')
+    if not 0 <= index < _chunk_count(meta):
+        raise ValueError('Índice de parte inválido.')
+    if not checksum:
+        raise ValueError('Checksum da parte ausente.')
+
+    start = time.perf_counter()
+    offset = index * meta['chunk_size']
+    expected = min(meta['chunk_size'], meta['size'] - offset)
+    digest = hashlib.sha256()
+    written = 0
+
+    with tempfile.TemporaryFile(dir=session_dir) as chunk:
+        while written <= expected:
+            block = stream.read(min(READ_BLOCK_SIZE, expected + 1 - written))
+            if not block:
+                break
+            written += len(block)
+            if written > expected:
+                break
+            digest.update(block)
+            chunk.write(block)
+
+        if written != expected:
+            raise ValueError(f'Tamanho da parte inválido: esperado {expected} bytes.')
+        if digest.hexdigest() != checksum.lower():
+            raise ValueError('Checksum da parte não confere.')
+
+        # The marker is dropped while the bytes are rewritten, so a write cut short
+        # leaves the chunk missing rather than marked received
+        marker_path = os.path.join(session_dir, 'chunks', str(index))
+        try:
+            os.remove(marker_path)
+        except FileNotFoundError:
+            pass
+        chunk.seek(0)
+        with open(os.path.join(session_dir, 'data'), 'r+b') as f:
+            f.seek(offset)
+            shutil.copyfileobj(chunk, f, READ_BLOCK_SIZE)
+
+    open(marker_path, 'w').close()
+    observe('upload_processing_seconds', time.perf_counter() - start, (('kind', 'video_chunk'),))
+    return get_upload_status(upload_id)
+
+
+def complete_upload(upload_id):
+    """Check that every chunk arrived and atomically move the file into the upload folder"""
+    session_dir = _session_dir(upload_id)
+    if session_dir is None:
+        raise LookupError('Upload não encontrado.')
+
+    meta = _read_meta(session_dir)
+    if meta['completed_filename'] is not None:
+        return meta['completed_filename']
+
+    missing = set(range(_chunk_count(meta))) - set(_received_chunks(session_dir))
+    if missing:
+        raise ValueError(f'Faltam {len(missing)} partes.')
+
+    start = time.perf_counter()
+    data_path = os.path.join(session_dir, 'data')
+    completed_filename = f"{upload_id}.{meta['ext']}"
+    completed_path = os.path.join(_upload_root(), completed_filename)
+    try:
+        if meta['sha256']:
+            digest = hashlib.sha256()
+            with open(data_path, 'rb') as f:
+                while block := f.read(READ_BLOCK_SIZE):
+                    digest.update(block)
+            if digest.hexdigest() != meta['sha256'].lower():
+                raise ValueError('Checksum do arquivo não confere.')
+        os.replace(data_path, completed_path)
+    except FileNotFoundError:
+        # A concurrent complete call moved the file first
+        if not os.path.exists(completed_path):
+            raise LookupError('Upload não encontrado.')
+        return completed_filename
+
+    meta['completed_filename'] = completed_filename
+    _write_meta(session_dir, meta)
+    observe('upload_processing_seconds', time.perf_counter() - start, (('kind', 'video_assembly'),))
+    return completed_filename
+
+
+def claim_upload(upload_id):
+    """Return the filename of a completed upload and close its session; None if not ready"""
+    session_dir = _session_dir(upload_id)
+    if session_dir is None:
+        return None
+
+    meta = _read_meta(session_dir)
+    filename = meta['completed_filename']
+    if filename is None or not os.path.exists(os.path.join(_upload_root(), filename)):
+        return None
+
+    shutil.rmtree(session_dir, ignore_errors=True)
+    return filename
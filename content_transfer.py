@@ -0,0 +1,304 @@
+import json
+import os
+import tarfile
+from datetime import date, datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import Date, DateTime, insert, select
+from werkzeug.utils import secure_filename
+from app import db
+from feeds import invalidate_feeds
+from freeze import refreeze_all
+from models import User, Category, Tag, Project, Achievement, Comment, Like, project_tags, UPLOAD_FILE_COLUMNS
+from suggest import invalidate_suggestions
+
+content_cli = AppGroup('content', help='Bulk import/export of portfolio content (JSONL).')
+
+# Record types in dependency order: parents are always written before children
+TABLES = [
+    ('user', User.__table__),
+    ('category', Category.__table__),
+    ('tag', Tag.__table__),
+    ('project', Project.__table__),
+    ('project_tag', project_tags),
+    ('achievement', Achievement.__table__),
+    ('comment', Comment.__table__),
+    ('like', Like.__table__),
+]
+
+# Foreign key columns and the record type whose ids they reference
+REFERENCES = {
+    'project': {'category_id': 'category'},
+    'project_tag': {'project_id': 'project', 'tag_id': 'tag'},
+    'comment': {'user_id': 'user', 'project_id': 'project'},
+    'like': {'user_id': 'user', 'project_id': 'project'},
+}
+
+# Unique columns used to reuse rows that already exist in the target database
+NATURAL_KEYS = {
+    'user': 'email',
+    'category': 'name',
+    'tag': 'name',
+}
+
+# User columns that leave the database: never is_admin, so an import file cannot grant
+# admin rights, and password hashes only when explicitly asked for
+USER_COLUMNS = ('id', 'name', 'email', 'profile_image', 'bio', 'created_at')
+CREDENTIAL_COLUMNS = ('password_hash',)
+# Stored for users imported without credentials; matches no password
+UNUSABLE_PASSWORD_HASH = '!'
+
+# Columns holding filenames inside the upload folder, per record type
+FILE_COLUMNS = {
+    record_type: [column.name for column in UPLOAD_FILE_COLUMNS if column.table is table]
+    for record_type, table in TABLES
+}
+
+BATCH_SIZE = 1000
+
+
+def _upload_dir():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+
+def _encode(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _decoders(table):
+    """Map column names to functions turning JSON values back into Python values"""
+    decoders = {}
+    for column in table.columns:
+        if isinstance(column.type, DateTime):
+            decoders[column.name] = datetime.fromisoformat
+        elif isinstance(column.type, Date):
+            decoders[column.name] = date.fromisoformat
+    return decoders
+
+
+def _export_columns(record_type, table, credentials):
+    if record_type == 'user':
+        return [table.c[name] for name in USER_COLUMNS + (CREDENTIAL_COLUMNS if credentials else ())]
+    return list(table.c)
+
+
+def export_content(out, bundle=None, credentials=False):
+    """
+    Stream every record to a JSONL file object; optionally tar the referenced uploads
+
+    Users are exported without their admin flag, and without password hashes
+    unless ``credentials`` is set.
+    """
+    counts = {}
+    upload_dir = _upload_dir()
+    bundled = set()
+
+    with db.engine.connect() as connection:
+        for record_type, table in TABLES:
+            counts[record_type] = 0
+            statement = select(*_export_columns(record_type, table, credentials))
+            if 'id' in table.c:
+                statement = statement.order_by(table.c.id)
+            result = connection.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(statement)
+
+            for row in result.mappings():
+                record = {'type': record_type}
+                record.update((key, _encode(value)) for key, value in row.items())
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                counts[record_type] += 1
+
+                if bundle is not None:
+                    for column in FILE_COLUMNS.get(record_type, []):
+                        filename = row[column]
+                        path = os.path.join(upload_dir, filename) if filename else None
+                        if path and filename not in bundled and os.path.isfile(path):
+                            bundle.add(path, arcname=filename)
+                            bundled.add(filename)
+
+    return counts
+
+
+class _Importer:
+    """Buffers records per type and inserts them in batches, remapping ids"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.tables = dict(TABLES)
+        self.decoders = {record_type: _decoders(table) for record_type, table in TABLES}
+        self.id_maps = {record_type: {} for record_type in ('user', 'category', 'tag', 'project')}
+        self.counts = {record_type: 0 for record_type, _ in TABLES}
+        self.skipped = {record_type: 0 for record_type, _ in TABLES}
+        self.pending_type = None
+        self.pending = []
+
+    def add(self, record):
+        record_type = record.pop('type', None)
+        if record_type not in self.tables:
+            raise click.ClickException(f"Unknown record type: {record_type!r}")
+
+        if record_type != self.pending_type:
+            self.flush()
+            self.pending_type = record_type
+
+        self.pending.append(record)
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        record_type, records = self.pending_type, self.pending
+        self.pending = []
+        table = self.tables[record_type]
+        decoders = self.decoders[record_type]
+        references = REFERENCES.get(record_type, {})
+
+        columns = set(USER_COLUMNS + CREDENTIAL_COLUMNS) if record_type == 'user' else set(table.c.keys())
+
+        old_ids, rows = [], []
+        for record in records:
+            row = {}
+            for key, value in record.items():
+                if key == 'id' or key not in columns:
+                    continue
+                if value is not None and key in decoders:
+                    value = decoders[key](value)
+                if value is not None and key in references:
+                    value = self.id_maps[references[key]].get(value)
+                    if value is None:
+                        break
+                row[key] = value
+            else:
+                if record_type == 'user':
+                    row['is_admin'] = False
+                    row['password_hash'] = row.get('password_hash') or UNUSABLE_PASSWORD_HASH
+                old_ids.append(record.get('id'))
+                rows.append(row)
+                continue
+            # A referenced parent was missing from the file; the row cannot be attached
+            self.skipped[record_type] += 1
+
+        if record_type in NATURAL_KEYS:
+            old_ids, rows = self._reuse_existing(record_type, old_ids, rows)
+
+        if not rows:
+            return
+
+        if record_type in self.id_maps:
+            result = self.connection.execute(
+                insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+            )
+            id_map = self.id_maps[record_type]
+            for old_id, new_id in zip(old_ids, result.scalars()):
+                id_map[old_id] = new_id
+        else:
+            self.connection.execute(insert(table), rows)
+
+        self.counts[record_type] += len(rows)
+
+    def _reuse_existing(self, record_type, old_ids, rows):
+        """Map rows whose natural key already exists onto the existing ids"""
+        table = self.tables[record_type]
+        key = NATURAL_KEYS[record_type]
+        existing = dict(self.connection.execute(
+            select(table.c[key], table.c.id).where(table.c[key].in_([row[key] for row in rows]))
+        ).all())
+
+        id_map = self.id_maps[record_type]
+        new_old_ids, new_rows = [], []
+        for old_id, row in zip(old_ids, rows):
+            if row[key] in existing:
+                id_map[old_id] = existing[row[key]]
+                self.skipped[record_type] += 1
+            else:
+                new_old_ids.append(old_id)
+                new_rows.append(row)
+        return new_old_ids, new_rows
+
+
+def import_content(lines, bundle=None):
+    """
+    Load JSONL records in a single transaction; optionally restore bundled uploads
+
+    Imported users are never admins; without a password hash in the file they
+    cannot log in until a password is set.
+    """
+    with db.engine.begin() as connection:
+        importer = _Importer(connection)
+        for line_number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise click.ClickException(f"Line {line_number}: invalid JSON ({e})")
+            importer.add(record)
+        importer.flush()
+
+    restored = 0
+    if bundle is not None:
+        upload_dir = _upload_dir()
+        os.makedirs(upload_dir, exist_ok=True)
+        for member in bundle:
+            # Only plain files with safe, flat names; never overwrite existing uploads
+            if not member.isfile() or secure_filename(member.name) != member.name:
+                continue
+            target = os.path.join(upload_dir, member.name)
+            if os.path.exists(target):
+                continue
+            with bundle.extractfile(member) as source, open(target, 'wb') as destination:
+                while chunk := source.read(1024 * 1024):
+                    destination.write(chunk)
+            restored += 1
+
+    return importer.counts, importer.skipped, restored
+
+
+@content_cli.command('export')
+@click.argument('output', type=click.File('w', encoding='utf-8'))
+@click.option('--files', 'files_path', type=click.Path(dir_okay=False, writable=True),
+              help='Also write the referenced uploads to this tar archive.')
+@click.option('--with-credentials', is_flag=True,
+              help='Include password hashes, so users can log in after an import.')
+def export_command(output, files_path, with_credentials):
+    """Export all content to OUTPUT as JSONL ("-" for stdout)."""
+    bundle = tarfile.open(files_path, 'w') if files_path else None
+    try:
+        counts = export_content(output, bundle, credentials=with_credentials)
+    finally:
+        if bundle is not None:
+            bundle.close()
+
+    for record_type, count in counts.items():
+        click.echo(f"{record_type}: {count}", err=True)
+
+
+@content_cli.command('import')
+@click.argument('input', type=click.File('r', encoding='utf-8'))
+@click.option('--files', 'files_path', type=click.Path(exists=True, dir_okay=False),
+              help='Restore uploads from this tar archive.')
+def import_command(input, files_path):
+    """Import content from a JSONL file produced by "content export"."""
+    bundle = tarfile.open(files_path, 'r') if files_path else None
+    try:
+        counts, skipped, restored = import_content(input, bundle)
+    finally:
+        if bundle is not None:
+            bundle.close()
+
+    # The import bypasses the ORM session, whose commits normally refresh these
+    invalidate_feeds()
+    invalidate_suggestions()
+    written, _ = refreeze_all()
+    if written:
+        click.echo(f"frozen pages: {written} rendered", err=True)
+
+    for record_type, count in counts.items():
+        click.echo(f"{record_type}: {count} imported, {skipped[record_type]} skipped", err=True)
+    if bundle is not None:
+        click.echo(f"files: {restored} restored", err=True)
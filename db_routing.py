@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql.expression import UpdateBase
+
+# Requests with these methods never write, so their reads can go to a replica
+READ_ONLY_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Session cookie key holding the timestamp until which a user reads from the primary
+STICKY_SESSION_KEY = '_db_primary_until'
+
+# WSGI environ key for internal requests that must read from the primary (e.g. page freezing)
+PRIMARY_ENVIRON_KEY = 'portfolio.db_primary'
+
+
+def _postgres_lag(connection):
+    """Seconds since the last transaction replayed on a Postgres standby"""
+    lag = connection.execute(text(
+        "SELECT CASE WHEN pg_is_in_recovery() "
+        "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+        "ELSE 0 END"
+    )).scalar()
+    return float(lag or 0)
+
+
+def _no_lag(connection):
+    """Replicas without a lag concept (e.g. SQLite copies) only need to answer"""
+    connection.execute(text("SELECT 1"))
+    return 0.0
+
+
+LAG_PROBES = {
+    'postgresql': _postgres_lag,
+}
+
+
+class Replica:
+    """A read replica engine with a cached health/lag check"""
+
+    def __init__(self, url, engine_options=None):
+        self.url = url
+        self.engine = create_engine(url, **(engine_options or {}))
+        self.probe = LAG_PROBES.get(self.engine.dialect.name, _no_lag)
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_available(self, max_lag, check_interval):
+        """Return whether the replica is reachable and not lagging too far behind"""
+        now = time.monotonic()
+        # Only one thread re-checks a stale replica; the others keep the last result
+        if now - self.checked_at >= check_interval and self._lock.acquire(blocking=False):
+            try:
+                with self.engine.connect() as connection:
+                    self.lag = self.probe(connection)
+                self.healthy = self.lag <= max_lag
+            except Exception as e:
+                self.healthy = False
+                current_app.logger.warning("Replica %s unavailable: %s", self.engine.url, e)
+            finally:
+                self.checked_at = now
+                self._lock.release()
+        return self.healthy
+
+
+class ReplicaSet:
+    """The replicas configured for an app plus the routing settings"""
+
+    def __init__(self, urls, engine_options=None, max_lag=10.0, check_interval=5.0):
+        self.replicas = [Replica(url, engine_options) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+
+    def pick(self):
+        """Return a healthy replica engine, or None to fall back to the primary"""
+        candidates = [r for r in self.replicas if r.is_available(self.max_lag, self.check_interval)]
+        if not candidates:
+            return None
+        return random.choice(candidates).engine
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads of read-only requests to a replica
+
+    Everything else goes to the primary: flushes, INSERT/UPDATE/DELETE statements,
+    non-GET requests, work outside of a request (CLI, startup) and requests from a
+    user who wrote recently (read-your-writes stickiness).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            replica = self._replica_engine()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _replica_engine(self):
+        if not has_request_context() or request.method not in READ_ONLY_METHODS:
+            return None
+        if request.environ.get(PRIMARY_ENVIRON_KEY):
+            return None
+
+        replicas = current_app.extensions.get('db_replicas')
+        if replicas is None or g.get('_db_wrote'):
+            return None
+
+        if session.get(STICKY_SESSION_KEY, 0) > time.time():
+            return None
+
+        # Keep every read of a request on the same replica
+        if 'db_replica' not in g:
+            g.db_replica = replicas.pick()
+        return g.db_replica
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(db_session, flush_context):
+    """Remember that the current request wrote to the primary"""
+    if has_request_context():
+        g._db_wrote = True
+
+
+def init_replicas(app):
+    """Set up read replicas from SQLALCHEMY_REPLICA_URIS, if any are configured"""
+    urls = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    if not urls:
+        return
+
+    app.extensions['db_replicas'] = ReplicaSet(
+        urls,
+        engine_options=app.config.get('SQLALCHEMY_REPLICA_ENGINE_OPTIONS'),
+        max_lag=app.config.get('REPLICA_MAX_LAG_SECONDS', 10.0),
+        check_interval=app.config.get('REPLICA_CHECK_INTERVAL', 5.0),
+    )
+
+    @app.after_request
+    def stick_to_primary(response):
+        # After a write, keep the user on the primary long enough for replicas to catch up
+        if g.get('_db_wrote'):
+            session[STICKY_SESSION_KEY] = time.time() + app.config.get('REPLICA_STICKY_SECONDS', 5)
+        return response
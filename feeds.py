@@ -0,0 +1,351 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+from flask import current_app, has_request_context, request, url_for
+from sqlalchemy import desc, event
+from app import db
+from db_routing import PRIMARY_ENVIRON_KEY
+from models import Project, Achievement
+from shared_files import locked, write_atomic
+
+# sitemaps.org limit per sitemap file; past it sitemap.xml becomes a sitemap index
+SITEMAP_MAX_URLS = 50000
+FEED_ENTRIES = 50
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+MANIFEST_FILE = 'manifest.json'
+
+# Documents rebuilt together; each group has its own version file (version-<group>)
+SITEMAP = 'sitemap'
+FEED = 'feed'
+GROUPS = (SITEMAP, FEED)
+
+CONTENT_TYPES = {
+    '.xml': 'application/xml; charset=utf-8',
+    '.atom': 'application/atom+xml; charset=utf-8',
+}
+
+
+def _w3c_datetime(value):
+    """Naive UTC datetime from the database to the W3C/RFC 3339 form used by sitemaps and Atom"""
+    return value.replace(microsecond=0).isoformat() + 'Z'
+
+
+class FeedStore:
+    """
+    Sitemap and Atom feed, pre-rendered into a directory shared by all workers
+
+    The sitemap documents and the feed are versioned separately: project
+    changes bump both, achievements only the feed. Relevant commits bump the
+    versions and schedule a rebuild of the stale group(s) in a background
+    thread, so no request waits for one. Requests keep getting the previous
+    documents until the new manifest is written; only the very first request,
+    with nothing built yet, renders them itself. Rebuilds are serialized across
+    workers with a file lock, and a rebuild racing with a commit records the
+    versions it started from, so the commit is never lost.
+    """
+
+    def __init__(self, app, directory, base_url=None, delay=1.0):
+        self.app = app
+        self.directory = directory
+        self.base_url = base_url
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.pending_base_url = None
+        self.thread = None
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def version(self, group):
+        return self._read(f'version-{group}') or '0'
+
+    def _manifest(self):
+        manifest = self._read(MANIFEST_FILE)
+        return json.loads(manifest) if manifest else None
+
+    def _stale_groups(self, manifest):
+        versions = manifest.get('versions', {}) if manifest else {}
+        return [group for group in GROUPS if versions.get(group) != self.version(group)]
+
+    def invalidate(self, groups=GROUPS):
+        """Mark documents stale (cheap; called after relevant commits)"""
+        os.makedirs(self.directory, exist_ok=True)
+        version = str(time.time_ns()).encode()
+        for group in groups:
+            write_atomic(self.path(f'version-{group}'), version)
+
+    def manifest(self):
+        """The newest manifest; stale documents are still served while they are rebuilt"""
+        manifest = self._manifest()
+        if manifest is not None and not self._stale_groups(manifest):
+            return manifest
+        base_url = self.base_url or request.url_root
+        if manifest is not None:
+            self.refresh_later(base_url)
+            return manifest
+        return self.refresh(base_url)
+
+    def refresh(self, base_url):
+        """Rebuild the stale documents unless another thread or worker already has"""
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock, locked(self.directory):
+            manifest = self._manifest()
+            stale = self._stale_groups(manifest)
+            if stale:
+                manifest = self.build(base_url, stale, manifest)
+        return manifest
+
+    def refresh_later(self, base_url=None):
+        """Rebuild in the background thread; without a base URL the next request schedules it"""
+        base_url = self.base_url or base_url
+        if not base_url:
+            return
+        with self.condition:
+            self.pending_base_url = base_url
+            # Started lazily so each forked gunicorn worker gets its own thread
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='feed-builder', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending_base_url is None:
+                    self.condition.wait()
+            # Coalesce bursts of commits (e.g. a content import) into one rebuild
+            time.sleep(self.delay)
+            with self.condition:
+                base_url, self.pending_base_url = self.pending_base_url, None
+            try:
+                self.refresh(base_url)
+            except Exception as e:
+                self.app.logger.error("Feed rebuild failed: %s", e)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def document(self, name):
+        """(path, content type, etag, last modified) of a current document, or None"""
+        meta = self.manifest()['documents'].get(name)
+        if meta is None:
+            return None
+        last_modified = meta['last_modified']
+        if last_modified:
+            last_modified = datetime.fromisoformat(last_modified[:-1]).replace(tzinfo=timezone.utc)
+        return self.path(name), CONTENT_TYPES[os.path.splitext(name)[1]], meta['etag'], last_modified
+
+    def build(self, base_url, groups=GROUPS, previous=None):
+        """Render the documents of ``groups`` and write a new manifest (under the lock)"""
+        versions = dict(previous.get('versions', {})) if previous else {}
+        versions.update((group, self.version(group)) for group in groups)
+        documents = {name: meta for name, meta in (previous or {}).get('documents', {}).items()
+                     if meta.get('group') in GROUPS and meta['group'] not in groups}
+
+        # Read from the primary: a lagging replica would be recorded as the current version
+        with self.app.test_request_context(base_url=base_url, environ_overrides={PRIMARY_ENVIRON_KEY: True}):
+            for group in groups:
+                for name, data, last_modified in self._render(group):
+                    write_atomic(self.path(name), data)
+                    documents[name] = {
+                        'group': group,
+                        'etag': hashlib.sha256(data).hexdigest()[:32],
+                        'last_modified': last_modified,
+                    }
+
+        manifest = {'versions': versions, 'built_at': time.time(), 'documents': documents}
+        write_atomic(self.path(MANIFEST_FILE), json.dumps(manifest).encode())
+
+        # Shards left over from a larger sitemap
+        for name in os.listdir(self.directory):
+            if name.startswith('sitemap-') and name.endswith('.xml') and name not in documents:
+                os.remove(self.path(name))
+        return manifest
+
+    def _render(self, group):
+        if group == SITEMAP:
+            yield from self._render_sitemaps()
+        else:
+            yield self._render_feed()
+
+    def _render_sitemaps(self):
+        """sitemap.xml, or sitemap-N.xml shards of SITEMAP_MAX_URLS and a sitemap index"""
+        newest = db.session.query(db.func.max(Project.updated_at)).filter(Project.is_published == True).scalar()
+        urls = [
+            (url_for('main.index', _external=True), newest),
+            (url_for('main.projects', _external=True), newest),
+            (url_for('main.about', _external=True), None),
+            (url_for('main.contact', _external=True), None),
+        ]
+        # Streamed in id order, so shards hold stable ranges of projects
+        projects = (db.session.query(Project.id, Project.updated_at)
+                    .filter(Project.is_published == True)
+                    .order_by(Project.id)
+                    .yield_per(5000))
+
+        shards = []
+
+        def close_shard(shard_urls):
+            shard_newest = max((lastmod for _, lastmod in shard_urls if lastmod), default=None)
+            shards.append((self._urlset(shard_urls), shard_newest))
+
+        for project_id, updated_at in projects:
+            if len(urls) >= SITEMAP_MAX_URLS:
+                close_shard(urls)
+                urls = []
+            urls.append((url_for('main.project_detail', id=project_id, _external=True), updated_at))
+        close_shard(urls)
+
+        if len(shards) == 1:
+            data, last_modified = shards[0]
+            yield 'sitemap.xml', data, _w3c_datetime(last_modified) if last_modified else None
+            return
+
+        index = [f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n']
+        for number, (data, last_modified) in enumerate(shards, 1):
+            name = f'sitemap-{number}.xml'
+            lastmod = _w3c_datetime(last_modified) if last_modified else None
+            yield name, data, lastmod
+            index.append(f'  <sitemap><loc>{escape(url_for("main.sitemap_shard", number=number, _external=True))}</loc>')
+            index.append(f'<lastmod>{lastmod}</lastmod></sitemap>\n' if lastmod else '</sitemap>\n')
+        index.append('</sitemapindex>\n')
+        yield 'sitemap.xml', ''.join(index).encode(), _w3c_datetime(newest) if newest else None
+
+    @staticmethod
+    def _urlset(urls):
+        parts = [f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n']
+        for loc, lastmod in urls:
+            parts.append(f'  <url><loc>{escape(loc)}</loc>')
+            parts.append(f'<lastmod>{_w3c_datetime(lastmod)}</lastmod></url>\n' if lastmod else '</url>\n')
+        parts.append('</urlset>\n')
+        return ''.join(parts).encode()
+
+    def _render_feed(self):
+        """Atom feed of the latest published projects and achievements"""
+        host = urlsplit(request.url_root).hostname or 'localhost'
+        entries = []
+        for project in (Project.query.filter_by(is_published=True)
+                        .order_by(desc(Project.updated_at)).limit(FEED_ENTRIES)):
+            link = url_for('main.project_detail', id=project.id, _external=True)
+            entries.append({
+                'id': f"tag:{host},{project.created_at:%Y-%m-%d}:project/{project.id}",
+                'title': project.title,
+                'link': link,
+                'updated': project.updated_at or project.created_at,
+                'published': project.created_at,
+                'summary': project.description,
+            })
+        # Achievements are never edited, so their creation time is their last update
+        for achievement in (Achievement.query.filter_by(is_published=True)
+                            .order_by(desc(Achievement.created_at)).limit(FEED_ENTRIES)):
+            entries.append({
+                'id': f"tag:{host},{achievement.created_at:%Y-%m-%d}:achievement/{achievement.id}",
+                'title': achievement.title,
+                'link': achievement.certificate_url or url_for('main.index', _external=True),
+                'updated': achievement.created_at,
+                'published': achievement.created_at,
+                'summary': achievement.description,
+            })
+        entries.sort(key=lambda entry: entry['updated'], reverse=True)
+        entries = entries[:FEED_ENTRIES]
+
+        updated = entries[0]['updated'] if entries else datetime(2000, 1, 1)
+        feed_url = url_for('main.feed', _external=True)
+        parts = [
+            f'<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="{ATOM_NS}">\n',
+            f'  <id>{escape(feed_url)}</id>\n',
+            '  <title>Portfólio Digital - Bruna Barboza</title>\n',
+            '  <subtitle>Projetos e conquistas</subtitle>\n',
+            f'  <link rel="self" type="application/atom+xml" href="{escape(feed_url)}"/>\n',
+            f'  <link rel="alternate" type="text/html" href="{escape(url_for("main.index", _external=True))}"/>\n',
+            f'  <updated>{_w3c_datetime(updated)}</updated>\n',
+            '  <author><name>Bruna Barboza</name></author>\n',
+        ]
+        for entry in entries:
+            parts += [
+                '  <entry>\n',
+                f'    <id>{escape(entry["id"])}</id>\n',
+                f'    <title>{escape(entry["title"])}</title>\n',
+                f'    <link rel="alternate" type="text/html" href="{escape(entry["link"])}"/>\n',
+                f'    <published>{_w3c_datetime(entry["published"])}</published>\n',
+                f'    <updated>{_w3c_datetime(entry["updated"])}</updated>\n',
+                f'    <summary>{escape(entry["summary"] or "")}</summary>\n',
+                '  </entry>\n',
+            ]
+        parts.append('</feed>\n')
+        return 'feed.atom', ''.join(parts).encode(), _w3c_datetime(updated)
+
+
+def _request_base_url():
+    return request.url_root if has_request_context() else None
+
+
+def invalidate_feeds():
+    """Mark the sitemap and feed stale after writes made outside the ORM session (e.g. imports)"""
+    store = current_app.extensions.get('feed_store')
+    if store is not None:
+        store.invalidate()
+        store.refresh_later(_request_base_url())
+
+
+def _groups(obj_class):
+    return GROUPS if obj_class is Project else (FEED,)
+
+
+def _track_changes(session, flush_context):
+    """Record which documents a flush touches"""
+    stale = session.info.setdefault('feeds_stale', set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, (Project, Achievement)):
+            stale.update(_groups(type(obj)))
+    for obj in session.dirty:
+        # Collection changes (e.g. a like appended to project.likes) do not change the documents
+        if isinstance(obj, (Project, Achievement)) and session.is_modified(obj, include_collections=False):
+            stale.update(_groups(type(obj)))
+
+
+def _track_bulk_changes(orm_execute_state):
+    """Bulk UPDATE/DELETE statements (bulk_actions) skip the flush"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (Project, Achievement):
+            orm_execute_state.session.info.setdefault('feeds_stale', set()).update(_groups(mapper.class_))
+
+
+def init_feeds(app):
+    """Attach a FeedStore to the app and mark it stale after relevant commits"""
+    store = FeedStore(
+        app,
+        app.config.get('FEEDS_DIR') or os.path.join(app.instance_path, 'feeds'),
+        base_url=app.config.get('SITE_URL') or app.config.get('FREEZE_BASE_URL'),
+        delay=app.config.get('FEEDS_DELAY', 1.0),
+    )
+    app.extensions['feed_store'] = store
+
+    session_class = db.session.session_factory.class_
+    event.listen(session_class, 'after_flush', _track_changes)
+    event.listen(session_class, 'do_orm_execute', _track_bulk_changes)
+
+    @event.listens_for(session_class, 'after_commit')
+    def invalidate_after_commit(session):
+        stale = session.info.pop('feeds_stale', None)
+        if stale:
+            store.invalidate(stale)
+            store.refresh_later(_request_base_url())
+
+    @event.listens_for(session_class, 'after_rollback')
+    def discard_changes(session):
+        session.info.pop('feeds_stale', None)
@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, TextAreaField, PasswordField, BooleanField, SelectField, URLField, DateField
+from wtforms import StringField, TextAreaField, PasswordField, BooleanField, SelectField, URLField, DateField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, Optional, URL
 
 class LoginForm(FlaskForm):
@@ -39,6 +39,7 @@ class ProjectForm(FlaskForm):
                      render_kw={"class": "form-control"})
     video = FileField('Vídeo', validators=[FileAllowed(['mp4', 'avi', 'mov', 'webm'], 'Apenas vídeos!')],
                      render_kw={"class": "form-control"})
+    video_upload_id = HiddenField('Upload do Vídeo', validators=[Optional(), Length(max=32)])
     project_url = URLField('URL do Projeto', validators=[Optional(), URL()],
                           render_kw={"class": "form-control", "placeholder": "https://projeto.com"})
     github_url = URLField('URL do GitHub', validators=[Optional(), URL()],
@@ -48,6 +49,16 @@ class ProjectForm(FlaskForm):
     is_published = BooleanField('Publicar', render_kw={"class": "form-check-input"})
     is_featured = BooleanField('Destacar', render_kw={"class": "form-check-input"})
 
+class BulkProjectForm(FlaskForm):
+    """Bulk action over the selected projects or every project matching the search"""
+    action = SelectField('Ação em lote', validators=[DataRequired()],
+                        choices=[('publish', 'Publicar'), ('unpublish', 'Despublicar'),
+                                 ('feature', 'Destacar'), ('unfeature', 'Remover destaque'),
+                                 ('delete', 'Excluir')],
+                        render_kw={"class": "form-select form-select-sm"})
+    apply_to_all = BooleanField('Aplicar a todos os resultados da busca', render_kw={"class": "form-check-input"})
+    search = HiddenField()
+
 class AchievementForm(FlaskForm):
     """Form for creating and editing achievements"""
     title = StringField('Título', validators=[DataRequired(), Length(max=200)],
@@ -0,0 +1,314 @@
+import math
+import os
+import shutil
+import threading
+import time
+from urllib.parse import quote, urlsplit
+import click
+from flask import current_app, request, url_for
+from flask.cli import AppGroup
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from app import db
+from db_routing import PRIMARY_ENVIRON_KEY
+from models import Project, Category, Tag, Achievement, Comment, Like, project_tags
+
+freeze_cli = AppGroup('freeze', help='Pre-render public pages to static files.')
+
+# WSGI environ key marking a request made by the freezer (cannot be set over HTTP)
+FREEZE_ENVIRON_KEY = 'portfolio.freeze'
+
+# Non-HttpOnly cookie telling frozen pages that the visitor is logged in and should hydrate
+USER_HINT_COOKIE = 'portfolio_user'
+
+PROJECTS_PER_PAGE = 9
+
+# Endpoints that skip the login hint cookie
+STATIC_ENDPOINTS = {'static', 'main.uploaded_file', None}
+
+
+def is_freezing():
+    """Whether the current request is rendering a frozen page"""
+    return bool(request.environ.get(FREEZE_ENVIRON_KEY))
+
+
+def output_path(output_dir, url):
+    """
+    File for a URL: /projects -> projects/index.html, /projects?page=2 -> projects/index@page=2.html
+
+    nginx serves these with:
+        set $frozen $uri/index.html;
+        if ($args) { set $frozen $uri/index@$args.html; }
+        try_files $frozen @app;
+
+    Slashes in the query (e.g. a tag named "../x") are percent-encoded so the
+    file stays in its directory; such pages are simply served by the app.
+    Raises ValueError for a URL whose file would land outside ``output_dir``.
+    """
+    parts = urlsplit(url)
+    directory = os.path.join(output_dir, parts.path.strip('/'))
+    # Already-encoded characters (%xx) are kept so the name matches nginx's $args
+    filename = f"index@{quote(parts.query, safe='=&%+,')}.html" if parts.query else 'index.html'
+    path = os.path.join(directory, filename)
+    if not os.path.realpath(path).startswith(os.path.realpath(output_dir) + os.sep):
+        raise ValueError(f"Frozen page for {url!r} would be written outside {output_dir}")
+    return path
+
+
+def _listing_urls(page_count, **filters):
+    """Every URL the templates link to for one projects listing, matching their url_for calls"""
+    urls = [url_for('main.projects', **filters)]
+    for page in range(1, page_count + 1):
+        # Same argument order as the pagination links, so the query strings match byte for byte
+        urls.append(url_for('main.projects', page=page, category=filters.get('category'),
+                            tag=filters.get('tag'), search=''))
+    return urls
+
+
+def _page_count(query):
+    return max(1, math.ceil(query.count() / PROJECTS_PER_PAGE))
+
+
+def all_urls():
+    """Every public page that can be frozen"""
+    published = Project.query.filter_by(is_published=True)
+    urls = [url_for('main.index'), url_for('main.about')]
+    urls += _listing_urls(_page_count(published))
+
+    for category_id, in db.session.query(Category.id):
+        urls += _listing_urls(_page_count(published.filter_by(category_id=category_id)), category=category_id)
+    for tag_name, in db.session.query(Tag.name):
+        urls += _listing_urls(_page_count(published.join(project_tags).join(Tag).filter(Tag.name == tag_name)),
+                              tag=tag_name)
+
+    urls += [url_for('main.project_detail', id=project_id)
+             for project_id, in published.with_entities(Project.id)]
+    return urls
+
+
+def affected_urls(project_ids, achievements_changed=False, counts_only=False, categories=(), tags=()):
+    """
+    Pages to re-render after a change
+
+    Likes and comments (counts_only) only show on the project page and the home
+    page stats. Project edits also move listings, the home page and the related
+    projects of other pages in the same category; ``categories`` and ``tags`` add
+    the listings a project was moved out of.
+    """
+    urls = {url_for('main.index')} if project_ids or achievements_changed else set()
+    urls.update(url_for('main.project_detail', id=project_id) for project_id in project_ids)
+    if counts_only or not project_ids:
+        return urls
+
+    published = Project.query.filter_by(is_published=True)
+    urls.update(_listing_urls(_page_count(published)))
+
+    projects = Project.query.filter(Project.id.in_(project_ids)).all()
+    category_ids = {project.category_id for project in projects} | set(categories)
+    category_ids.discard(None)
+    tag_names = {tag.name for project in projects for tag in project.tags} | set(tags)
+
+    for category_id in category_ids:
+        urls.update(_listing_urls(_page_count(published.filter_by(category_id=category_id)), category=category_id))
+        # Related projects on the other pages of the category
+        urls.update(url_for('main.project_detail', id=project_id)
+                    for project_id, in published.filter_by(category_id=category_id).with_entities(Project.id))
+    for tag_name in tag_names:
+        urls.update(_listing_urls(_page_count(published.join(project_tags).join(Tag).filter(Tag.name == tag_name)),
+                                  tag=tag_name))
+    return urls
+
+
+def render_pages(app, output_dir, urls, base_url=None):
+    """Render URLs as an anonymous visitor; pages that are gone are removed from the output"""
+    client = app.test_client()
+    # Pages re-rendered right after a commit must not read from a lagging replica
+    environ = {FREEZE_ENVIRON_KEY: True, PRIMARY_ENVIRON_KEY: True}
+    written = removed = 0
+    for url in urls:
+        try:
+            path = output_path(output_dir, url)
+        except ValueError as e:
+            app.logger.warning("Skipping page: %s", e)
+            continue
+        response = client.get(url, base_url=base_url, environ_overrides=environ)
+        if response.status_code == 200:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Atomic replace so nginx never serves a half-written page; the temporary
+            # name is unique per writer, since every worker runs its own Refreezer
+            tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(response.get_data())
+            os.replace(tmp_path, path)
+            written += 1
+        elif os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    return written, removed
+
+
+def _empty_changes():
+    return {'projects': set(), 'counts': set(), 'categories': set(), 'tags': set(), 'achievements': False}
+
+
+class Refreezer:
+    """Re-renders affected pages in a background thread after committed writes"""
+
+    def __init__(self, app, output_dir, delay=2.0):
+        self.app = app
+        self.output_dir = output_dir
+        self.delay = delay
+        self.condition = threading.Condition()
+        self.pending = _empty_changes()
+        self.thread = None
+
+    def enqueue(self, changes):
+        with self.condition:
+            for key, value in changes.items():
+                if key == 'achievements':
+                    self.pending[key] |= value
+                else:
+                    self.pending[key].update(value)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='refreezer', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not any(self.pending.values()):
+                    self.condition.wait()
+            # Coalesce bursts of writes (e.g. several likes) into one render
+            time.sleep(self.delay)
+            with self.condition:
+                pending, self.pending = self.pending, _empty_changes()
+            try:
+                self.refreeze(pending)
+            except Exception as e:
+                self.app.logger.error("Incremental freeze failed: %s", e)
+
+    def refreeze(self, changes):
+        """Re-render the pages affected by a set of changes"""
+        base_url = self.app.config.get('FREEZE_BASE_URL')
+        with self.app.test_request_context(base_url=base_url):
+            urls = affected_urls(changes['projects'], changes['achievements'],
+                                 categories=changes['categories'], tags=changes['tags'])
+            urls |= affected_urls(changes['counts'] - changes['projects'], counts_only=True)
+        return render_pages(self.app, self.output_dir, sorted(urls), base_url=base_url)
+
+
+def refreeze_all():
+    """
+    Re-render every frozen page after writes made outside the ORM session (e.g. imports)
+
+    Runs in the calling thread, so a CLI command does not exit before the pages
+    are written. Returns (written, removed), or (0, 0) when freezing is off.
+    """
+    refreezer = current_app.extensions.get('refreezer')
+    if refreezer is None:
+        return 0, 0
+    base_url = refreezer.app.config.get('FREEZE_BASE_URL')
+    with refreezer.app.test_request_context(base_url=base_url):
+        urls = all_urls()
+    return render_pages(refreezer.app, refreezer.output_dir, urls, base_url=base_url)
+
+
+def _track_changes(session, flush_context):
+    """Collect which frozen pages the flushed objects affect"""
+    changes = session.info.setdefault('freeze_changes', _empty_changes())
+    # Still the pre-flush new/dirty/deleted collections, with primary keys assigned
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Project):
+            changes['projects'].add(obj.id)
+            if obj in session.deleted:
+                # The row is gone, so its listings cannot be looked up after the commit
+                changes['categories'].add(obj.category_id)
+                changes['tags'].update(tag.name for tag in obj.tags)
+            # Listings the project was moved out of
+            state = inspect(obj)
+            changes['categories'].update(value for value in state.attrs.category_id.history.deleted if value)
+            changes['tags'].update(tag.name for tag in state.attrs.tags.history.deleted)
+        elif isinstance(obj, (Comment, Like)):
+            changes['counts'].add(obj.project_id)
+        elif isinstance(obj, Achievement):
+            changes['achievements'] = True
+
+
+def track_project_changes(session, project_ids, deleted=False):
+    """
+    Record projects changed by bulk UPDATE/DELETE statements, which skip the flush
+
+    For deleted projects the listings they appeared in are looked up now, while
+    the rows still exist.
+    """
+    if 'refreezer' not in current_app.extensions:
+        return
+    changes = session.info.setdefault('freeze_changes', _empty_changes())
+    changes['projects'].update(project_ids)
+    if deleted:
+        changes['categories'].update(category_id for category_id, in session.query(Project.category_id)
+                                     .filter(Project.id.in_(project_ids), Project.category_id.isnot(None)).distinct())
+        changes['tags'].update(name for name, in session.query(Tag.name).join(project_tags)
+                               .filter(project_tags.c.project_id.in_(project_ids)).distinct())
+
+
+def init_freeze(app):
+    """Keep frozen pages up to date and serve the login hint cookie (when FREEZE_OUTPUT is set)"""
+
+    @app.context_processor
+    def inject_frozen():
+        return {'frozen': is_freezing()}
+
+    output_dir = app.config.get('FREEZE_OUTPUT')
+    if not output_dir:
+        return
+
+    @app.after_request
+    def sync_user_hint(response):
+        # Static files and uploads never need the user loaded
+        if is_freezing() or request.endpoint in STATIC_ENDPOINTS:
+            return response
+        logged_in = current_user.is_authenticated
+        if logged_in and not request.cookies.get(USER_HINT_COOKIE):
+            response.set_cookie(USER_HINT_COOKIE, '1', samesite='Lax')
+        elif not logged_in and request.cookies.get(USER_HINT_COOKIE):
+            response.delete_cookie(USER_HINT_COOKIE)
+        return response
+
+    refreezer = Refreezer(app, output_dir, delay=app.config.get('FREEZE_DELAY', 2.0))
+    app.extensions['refreezer'] = refreezer
+    session_class = db.session.session_factory.class_
+    event.listen(session_class, 'after_flush', _track_changes)
+
+    @event.listens_for(session_class, 'after_commit')
+    def enqueue_refreeze(session):
+        changes = session.info.pop('freeze_changes', None)
+        if changes:
+            changes['counts'].discard(None)
+            refreezer.enqueue(changes)
+
+    @event.listens_for(session_class, 'after_rollback')
+    def discard_changes(session):
+        session.info.pop('freeze_changes', None)
+
+
+@freeze_cli.command('build')
+@click.option('--output', type=click.Path(file_okay=False),
+              help='Output directory (defaults to FREEZE_OUTPUT).')
+@click.option('--base-url', help='Public URL of the site, used for absolute links.')
+@click.option('--clean', is_flag=True, help='Empty the output directory first.')
+def build_command(output, base_url, clean):
+    """Render every public page to static HTML."""
+    output = output or current_app.config.get('FREEZE_OUTPUT')
+    if not output:
+        raise click.UsageError('Pass --output or set FREEZE_OUTPUT.')
+    base_url = base_url or current_app.config.get('FREEZE_BASE_URL')
+
+    if clean and os.path.isdir(output):
+        shutil.rmtree(output)
+
+    with current_app.test_request_context(base_url=base_url):
+        urls = all_urls()
+    written, removed = render_pages(current_app._get_current_object(), output, urls, base_url=base_url)
+    click.echo(f"Rendered {written} pages into {output} ({removed} removed)")
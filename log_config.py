@@ -0,0 +1,199 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Incoming request ids (e.g. from nginx $request_id) are reused when they look sane
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id and exception"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id and request_id != '-':
+            data['request_id'] = request_id
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Rendered on the logging thread by NonBlockingQueueHandler.prepare
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id while still on the request's thread"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records below WARNING from the configured loggers"""
+
+    def __init__(self, rates):
+        super().__init__()
+        # Most specific logger name first
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for name, rate in self.rates:
+            if record.name == name or record.name.startswith(name + '.'):
+                return random.random() < rate
+        return True
+
+
+_exception_formatter = logging.Formatter()
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room instead of failing when stopping with a full queue
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hand records to a listener thread that formats and writes them
+
+    The calling thread only merges the message with its arguments (so
+    ``__repr__`` of ORM objects and mutable arguments are read where they were
+    logged) and enqueues the record; JSON encoding and the write to stderr
+    happen in the listener. When the
+    queue is full the record is dropped rather than blocking the request, and
+    the number of dropped records is logged once there is room again.
+    """
+
+    def __init__(self, handlers, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.targets = handlers
+        self.dropped = 0
+        self.listener = None
+        self.pid = None
+
+    def prepare(self, record):
+        # Like QueueHandler, but only the message and traceback are rendered here;
+        # the formatter still runs in the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        # One listener per process, so forked gunicorn workers get their own
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': 'Dropped %d log records (queue full)', 'args': (self.dropped,), 'request_id': '-',
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        self.pid = os.getpid()
+        self.listener = _Listener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def flush(self):
+        """Wait until the listener has written everything queued so far"""
+        if self.listener is not None and self.pid == os.getpid():
+            self.queue.join()
+
+    def stop(self):
+        """Write out everything queued so far and stop the listener"""
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+
+
+def parse_sample_rates(value):
+    """'werkzeug=0.1,sqlalchemy.engine=0.01' -> {'werkzeug': 0.1, 'sqlalchemy.engine': 0.01}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, rate = item.partition('=')
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def configure_logging():
+    """
+    Set up the root logger from the environment
+
+    LOG_FORMAT=json (default): queued, non-blocking JSON lines on stderr.
+    LOG_FORMAT=text: plain synchronous lines, for local development.
+    LOG_LEVEL sets the root level (INFO by default) and LOG_SAMPLE keeps only a
+    fraction of the sub-WARNING records of the listed loggers.
+    """
+    root = logging.getLogger()
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    output = logging.StreamHandler(sys.stderr)
+    if os.environ.get('LOG_FORMAT', 'json') == 'text':
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handler = output
+    else:
+        # The JSON records carry none of these, so skip collecting them on every call
+        # (the optimizations listed in the logging documentation)
+        logging._srcfile = None
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+        output.setFormatter(JSONFormatter())
+        handler = NonBlockingQueueHandler([output], maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+
+    # Sampling first, so dropped records cost as little as possible
+    rates = parse_sample_rates(os.environ.get('LOG_SAMPLE'))
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+    handler.addFilter(RequestIdFilter())
+
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    return handler
+
+
+def init_request_ids(app):
+    """Give every request an id, reusing a valid incoming X-Request-ID, and echo it in the response"""
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+
+    @app.after_request
+    def send_request_id(response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
@@ -0,0 +1,389 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from shared_files import instance_suffix, locked, write_atomic
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+UPLOAD_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status.', None),
+    'http_request_duration_seconds': ('histogram', 'Time until the response body was sent.', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Response body size.', SIZE_BUCKETS),
+    'http_requests_in_flight': ('gauge', 'Requests being handled.', None),
+    'db_pool_checkouts_total': ('counter', 'Connections checked out of the SQLAlchemy pool.', None),
+    'db_pool_checkout_wait_seconds': ('histogram', 'Time to get a pool connection, including opening new ones.',
+                                      WAIT_BUCKETS),
+    'db_pool_checked_out': ('gauge', 'Pool connections in use.', None),
+    'db_pool_overflow': ('gauge', 'Connections open beyond the pool size.', None),
+    'db_pool_size': ('gauge', 'Configured pool size.', None),
+    'upload_processing_seconds': ('histogram', 'Time to store an upload, by kind.', UPLOAD_BUCKETS),
+    'smtp_sends_total': ('counter', 'Contact emails by outcome.', None),
+}
+
+# WSGI environ key where the matched endpoint is left for the middleware (set by Flask or the rate limiter)
+ENDPOINT_ENVIRON_KEY = 'portfolio.endpoint'
+
+SNAPSHOT_PATTERN = re.compile(r'^(\d+)\.json$')
+ARCHIVE_FILE = 'archive.json'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    write_atomic(path, json.dumps(data).encode())
+
+
+class Metrics:
+    """
+    Counters and histograms for one process, aggregated across gunicorn workers
+
+    Recording only updates a dict under a lock. Each worker writes its totals
+    to <directory>/<pid>.json every flush interval and at exit; a scrape merges
+    every worker's file, so any worker can answer /metrics. Files of workers
+    that are gone are folded into archive.json so their counts are not lost,
+    while their gauges are dropped.
+    """
+
+    def __init__(self, app, directory, flush_interval=5.0):
+        self.app = app
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.inflight = 0
+        self._counters = defaultdict(float)   # (name, labels) -> value
+        self._histograms = {}                 # (name, labels) -> [count per bucket..., +Inf count, sum]
+        self._gauges = [lambda: [('http_requests_in_flight', (), self.inflight)]]
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def inc(self, name, labels=(), value=1):
+        """Add to a counter; labels is a tuple of (name, value) pairs"""
+        with self._lock:
+            self._counters[(name, labels)] += value
+        if self._pid != os.getpid():
+            self._start()
+
+    def observe(self, name, value, labels=()):
+        """Record a histogram observation"""
+        buckets = METRICS[name][2]
+        index = bisect.bisect_left(buckets, value)
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += value
+        if self._pid != os.getpid():
+            self._start()
+
+    def add_gauges(self, callback):
+        """Register a callable returning [(name, labels, value)], read at each flush"""
+        self._gauges.append(callback)
+
+    def _start(self):
+        # Started lazily so each forked gunicorn worker gets its own flusher
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+        thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.error("Failed to flush metrics: %s", e)
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, labels, list(values)] for (name, labels), values in self._histograms.items()]
+        gauges = [[name, labels, value] for callback in self._gauges for name, labels, value in callback()]
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+    def flush(self):
+        """Write this worker's totals for other workers to read"""
+        os.makedirs(self.directory, exist_ok=True)
+        _write_json(os.path.join(self.directory, f"{os.getpid()}.json"), self.snapshot())
+
+    def collect(self):
+        """Merge the totals of every worker, current and past"""
+        self.flush()
+        live = []
+        with locked(self.directory):
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            archive = _read_json(archive_path) or {'counters': [], 'histograms': []}
+            archived = False
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    match = SNAPSHOT_PATTERN.match(entry.name)
+                    if not match:
+                        continue
+                    data = _read_json(entry.path)
+                    if data is None:
+                        continue
+                    if _alive(int(match.group(1))):
+                        live.append(data)
+                    else:
+                        archive = _merge([archive, data])
+                        os.remove(entry.path)
+                        archived = True
+            if archived:
+                _write_json(archive_path, archive)
+
+        merged = _merge([archive] + live)
+        merged['gauges'] = _merge_gauges(live)
+        return merged
+
+
+def _key(name, labels):
+    return name, tuple(tuple(pair) for pair in labels)
+
+
+def _merge(snapshots):
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[_key(name, labels)] += value
+        for name, labels, values in snapshot['histograms']:
+            key = _key(name, labels)
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+    }
+
+
+def _merge_gauges(snapshots):
+    gauges = defaultdict(float)
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['gauges']:
+            gauges[_key(name, labels)] += value
+    return [[name, labels, value] for (name, labels), value in gauges.items()]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render_metrics(merged):
+    """Prometheus text exposition format (0.0.4)"""
+    samples = defaultdict(list)
+    for kind in ('counters', 'gauges', 'histograms'):
+        for name, labels, value in merged[kind]:
+            samples[name].append((tuple(labels), value))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(samples.get(name, [])):
+            if kind != 'histogram':
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (float('inf'),), value[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+class _ClosingIterable:
+    """Response body wrapper that counts bytes and reports once, when the body is done"""
+
+    def __init__(self, iterable, on_done):
+        self.iterable = iterable
+        self.on_done = on_done
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            self.size += len(chunk)
+            yield chunk
+        self._done()
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            self._done()
+
+    def _done(self):
+        on_done, self.on_done = self.on_done, None
+        if on_done is not None:
+            on_done(self.size)
+
+
+class MetricsMiddleware:
+    """WSGI middleware recording latency, status, response size and in-flight requests per route"""
+
+    def __init__(self, app, wsgi_app, metrics):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        metrics = self.metrics
+        with metrics._lock:
+            metrics.inflight += 1
+
+        response = {}
+
+        def recording_start_response(status, headers, exc_info=None):
+            response['status'] = status.split(' ', 1)[0]
+            for name, value in headers:
+                if name.lower() == 'content-length':
+                    response['length'] = int(value)
+            return start_response(status, headers, exc_info)
+
+        def finish(size):
+            with metrics._lock:
+                metrics.inflight -= 1
+            self._record(environ, response.get('status', '500'), response.get('length', size),
+                         time.perf_counter() - start)
+
+        try:
+            iterable = self.wsgi_app(environ, recording_start_response)
+        except BaseException:
+            finish(0)
+            raise
+        return _ClosingIterable(iterable, finish)
+
+    def _record(self, environ, status, size, duration):
+        # Flask already matched the URL; one label for everything unrouted keeps the series count bounded
+        endpoint = environ.get(ENDPOINT_ENVIRON_KEY) or 'unmatched'
+        method = environ.get('REQUEST_METHOD', 'GET')
+        route = (('endpoint', endpoint), ('method', method))
+        self.metrics.inc('http_requests_total', route + (('status', status),))
+        self.metrics.observe('http_request_duration_seconds', duration, route)
+        self.metrics.observe('http_response_size_bytes', size, (('endpoint', endpoint),))
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a connection"""
+
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe('db_pool_checkout_wait_seconds', time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+# Pools log under their class's module; keep this one as quiet as SQLAlchemy's own
+logging.getLogger(f"{__name__}.InstrumentedQueuePool").setLevel(logging.WARNING)
+
+
+def default_directory(app):
+    """
+    METRICS_DIR on tmpfs when available, shared by the workers of one deployment
+
+    The name is derived from the app's instance path, so other apps or a second
+    deployment on the same host never merge their counters into this one.
+    """
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, f"portfolio-metrics-{instance_suffix(app)}")
+
+
+def inc(name, labels=(), value=1):
+    """Add to a counter of the current app, if metrics are enabled"""
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.inc(name, labels, value)
+
+
+def observe(name, value, labels=()):
+    """Record a histogram observation for the current app, if metrics are enabled"""
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.observe(name, value, labels)
+
+
+def init_metrics(app, db):
+    """Attach a Metrics registry, time requests and instrument the primary engine's pool"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    metrics = Metrics(app, app.config['METRICS_DIR'], flush_interval=app.config.get('METRICS_FLUSH_INTERVAL', 5.0))
+    app.extensions['metrics'] = metrics
+    app.wsgi_app = MetricsMiddleware(app, app.wsgi_app, metrics)
+
+    @app.before_request
+    def expose_endpoint():
+        request.environ[ENDPOINT_ENVIRON_KEY] = request.endpoint
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'checkout', lambda *args: metrics.inc('db_pool_checkouts_total'))
+
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.metrics = metrics
+    if isinstance(pool, QueuePool):
+        metrics.add_gauges(lambda: [
+            ('db_pool_checked_out', (), engine.pool.checkedout()),
+            ('db_pool_overflow', (), max(0, engine.pool.overflow())),
+            ('db_pool_size', (), engine.pool.size()),
+        ])
@@ -50,8 +50,10 @@ class Tag(db.Model):
 
 # Association table for many-to-many relationship between projects and tags
 project_tags = db.Table('project_tags',
-    db.Column('project_id', db.Integer, db.ForeignKey('projects.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+    db.Column('project_id', db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True),
+    # The primary key only serves lookups by project; tag filters go through tag_id
+    db.Index('ix_project_tags_tag_project', 'tag_id', 'project_id')
 )
 
 class Project(db.Model):
@@ -77,8 +79,26 @@ class Project(db.Model):
     # Relationships
     tags = db.relationship('Tag', secondary=project_tags, lazy='subquery',
                           backref=db.backref('projects', lazy=True))
-    comments = db.relationship('Comment', backref='project', lazy=True, cascade='all, delete-orphan')
-    likes = db.relationship('Like', backref='project', lazy=True, cascade='all, delete-orphan')
+    # Dependent rows are removed by ON DELETE CASCADE (see bulk_actions), not loaded to be deleted
+    comments = db.relationship('Comment', backref='project', lazy=True, cascade='all, delete-orphan',
+                               passive_deletes=True)
+    likes = db.relationship('Like', backref='project', lazy=True, cascade='all, delete-orphan',
+                            passive_deletes=True)
+    view_days = db.relationship('ProjectViewDay', backref='project', lazy=True, cascade='all, delete-orphan',
+                                passive_deletes=True)
+    
+    __table_args__ = (
+        # Home page featured projects
+        db.Index('ix_projects_published_featured_created', 'is_published', 'is_featured', 'created_at'),
+        # Public listing, API cursor pagination and published counts
+        db.Index('ix_projects_published_created', 'is_published', 'created_at', 'id'),
+        # Category filter and related projects
+        db.Index('ix_projects_category_published_created', 'category_id', 'is_published', 'created_at'),
+        # Admin listing of every project
+        db.Index('ix_projects_created', 'created_at'),
+        # Atom feed and sitemap lastmod (latest updates first)
+        db.Index('ix_projects_published_updated', 'is_published', 'updated_at'),
+    )
     
     @property
     def likes_count(self):
@@ -105,6 +125,10 @@ class Achievement(db.Model):
     is_published = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_achievements_published_created', 'is_published', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<Achievement {self.title}>'
 
@@ -118,7 +142,14 @@ class Comment(db.Model):
     
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_comments_project_created', 'project_id', 'created_at'),
+        db.Index('ix_comments_user_created', 'user_id', 'created_at'),
+        # Recent comments on the admin dashboard
+        db.Index('ix_comments_created', 'created_at'),
+    )
     
     def __repr__(self):
         return f'<Comment by {self.user.name}>'
@@ -132,14 +163,36 @@ class Like(db.Model):
     
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False)
     
     # Unique constraint to prevent duplicate likes
-    __table_args__ = (db.UniqueConstraint('user_id', 'project_id', name='unique_user_project_like'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'project_id', name='unique_user_project_like'),
+        # Like counts per project (the unique constraint leads with user_id)
+        db.Index('ix_likes_project', 'project_id'),
+        # Profile activity feed, newest first
+        db.Index('ix_likes_user_created', 'user_id', 'created_at'),
+    )
     
     def __repr__(self):
         return f'<Like by {self.user.name} on {self.project.title}>'
 
+class ProjectViewDay(db.Model):
+    """Daily view totals per project, written in batches by view_tracking"""
+    __tablename__ = 'project_view_days'
+    
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        # Dashboard totals by day, answered from the index alone
+        db.Index('ix_project_view_days_day', 'day', 'project_id', 'views'),
+    )
+    
+    def __repr__(self):
+        return f'<ProjectViewDay {self.project_id} {self.day}: {self.views}>'
+
 class ContactMessage(db.Model):
     """Contact message model for visitor inquiries"""
     __tablename__ = 'contact_messages'
@@ -152,5 +205,18 @@ class ContactMessage(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_contact_messages_read_created', 'is_read', 'created_at'),
+        db.Index('ix_contact_messages_created', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<ContactMessage from {self.email}>'
+
+# Columns holding filenames inside the upload folder
+UPLOAD_FILE_COLUMNS = (
+    User.profile_image,
+    Project.image_url,
+    Project.video_url,
+    Achievement.image_url,
+)
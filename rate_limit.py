@@ -0,0 +1,206 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request, Response
+from metrics import ENDPOINT_ENVIRON_KEY
+from shared_files import instance_suffix
+
+# endpoint -> (burst capacity, seconds to refill the whole bucket)
+DEFAULT_LIMITS = {
+    'main.toggle_like': (30, 60),
+    'main.add_comment': (5, 60),
+    'main.contact': (3, 600),
+    'auth.register': (5, 3600),
+    'api.api_project_view': (30, 60),
+}
+
+
+class MemoryBackend:
+    """Token buckets in this process only (one set per gunicorn worker)"""
+
+    def __init__(self, max_keys=100_000):
+        self.buckets = {}
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, refill_seconds):
+        """Take a token; returns 0 if allowed, else seconds until one is available"""
+        rate = capacity / refill_seconds
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now)
+                return 0
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self._prune(now)
+        return (1 - tokens) / rate
+
+    def _prune(self, now):
+        # Drop the oldest half; a dropped bucket just starts full again
+        by_age = sorted(self.buckets.items(), key=lambda item: item[1][1])
+        self.buckets = dict(by_age[len(by_age) // 2:])
+
+
+class SQLiteBackend:
+    """
+    Token buckets shared by all workers on one host through a small SQLite file
+
+    Place it on tmpfs (/dev/shm) so it behaves like shared memory; nothing in it
+    needs to survive a restart. Buckets idle for longer than ``max_age`` (the
+    longest refill time) are full again and are deleted every prune interval.
+    """
+
+    def __init__(self, path, max_age=3600, prune_interval=60):
+        self.path = path
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self.pruned_at = 0.0
+        self.local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self.local.connection = connection
+        return connection
+
+    def take(self, key, capacity, refill_seconds):
+        """Take a token; returns 0 if allowed, else seconds until one is available"""
+        rate = capacity / refill_seconds
+        now = time.time()
+        connection = self._connection()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= 1
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens - 1 if allowed else tokens, now),
+            )
+            if now - self.pruned_at > self.prune_interval:
+                self.pruned_at = now
+                connection.execute("DELETE FROM buckets WHERE updated < ?", (now - self.max_age,))
+            connection.execute("COMMIT")
+        except Exception:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        return 0 if allowed else (1 - tokens) / rate
+
+
+class RateLimitMiddleware:
+    """
+    WSGI middleware that throttles write endpoints before Flask handles them
+
+    Requests are matched against the URL map and keyed by endpoint plus the
+    logged-in user (read from the signed session cookie, no database access)
+    or the client IP. Over-limit requests get 429 with Retry-After; when too
+    many throttled-endpoint requests are already running in this worker, new
+    ones get 503 so the write path is not flooded.
+    """
+
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.limits = app.config.get('RATELIMITS', DEFAULT_LIMITS)
+        self.max_inflight = app.config.get('RATELIMIT_MAX_INFLIGHT', 32)
+        self.inflight = 0
+        self.inflight_lock = threading.Lock()
+
+        storage = app.config.get('RATELIMIT_STORAGE', 'memory')
+        if storage == 'memory':
+            self.backend = MemoryBackend()
+        else:
+            max_age = max((refill_seconds for _, refill_seconds in self.limits.values()), default=3600)
+            try:
+                self.backend = SQLiteBackend(storage, max_age=max_age)
+            except (sqlite3.Error, OSError) as e:
+                # Degrade to per-worker limits rather than failing to start
+                app.logger.error("Rate limit storage %s unavailable, using memory: %s", storage, e)
+                self.backend = MemoryBackend()
+
+    def __call__(self, environ, start_response):
+        if not self.app.config.get('RATELIMIT_ENABLED', True) or environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = None
+        # Label for the metrics middleware when the request is rejected here
+        environ[ENDPOINT_ENVIRON_KEY] = endpoint
+
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return self.wsgi_app(environ, start_response)
+
+        request = Request(environ)
+        identity = self._identity(request)
+        try:
+            retry_after = self.backend.take(f"{endpoint}:{identity}", *limit)
+        except sqlite3.Error as e:
+            # Fail open: a locked or broken limiter file must not take the site down
+            self.app.logger.error("Rate limiter unavailable, allowing request: %s", e)
+            retry_after = 0
+        if retry_after:
+            return self._reject(request, 429, retry_after,
+                                'Muitas requisições. Tente novamente em alguns instantes.')(environ, start_response)
+
+        with self.inflight_lock:
+            if self.inflight >= self.max_inflight:
+                shed = True
+            else:
+                shed = False
+                self.inflight += 1
+        if shed:
+            return self._reject(request, 503, 1, 'Servidor ocupado. Tente novamente.')(environ, start_response)
+
+        try:
+            # Iterable responses are consumed by the server after we return, which is
+            # fine: the expensive part (form, database) has already run
+            return self.wsgi_app(environ, start_response)
+        finally:
+            with self.inflight_lock:
+                self.inflight -= 1
+
+    def _identity(self, request):
+        cookie = request.cookies.get(self.app.config.get('SESSION_COOKIE_NAME', 'session'))
+        if cookie:
+            serializer = self.app.session_interface.get_signing_serializer(self.app)
+            try:
+                data = serializer.loads(cookie, max_age=int(self.app.permanent_session_lifetime.total_seconds()))
+            except Exception:
+                data = {}
+            if data.get('_user_id'):
+                return f"user:{data['_user_id']}"
+        return f"ip:{request.remote_addr}"
+
+    def _reject(self, request, status, retry_after, message):
+        retry_after = max(1, int(retry_after + 0.999))
+        if request.path.startswith('/api/') or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            response = Response(json.dumps({'error': message, 'retry_after': retry_after}),
+                                status=status, mimetype='application/json')
+        else:
+            response = Response(message, status=status, mimetype='text/plain')
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+
+def default_storage(app):
+    """RATELIMIT_STORAGE value for a file on tmpfs when available, shared by the workers of this app only"""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, f"portfolio-ratelimit-{instance_suffix(app)}.db")
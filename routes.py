@@ -1,19 +1,33 @@
 import os
-from datetime import datetime
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, send_from_directory
+import base64
+import hashlib
+import hmac
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, send_from_directory, send_file, abort
 from flask_login import login_user, logout_user, login_required, current_user
+from flask_wtf.csrf import generate_csrf, validate_csrf
+from wtforms.validators import ValidationError
 from werkzeug.security import check_password_hash, generate_password_hash
-from sqlalchemy import or_, desc
+from sqlalchemy import or_, and_, desc, literal, null, select, union_all
+from sqlalchemy.orm import joinedload, lazyload, load_only
 from app import db
-from models import User, Project, Category, Tag, Comment, Like, Achievement, ContactMessage, project_tags
+from models import User, Project, Category, Tag, Comment, Like, Achievement, ContactMessage, ProjectViewDay, project_tags
 from forms import (LoginForm, RegisterForm, ProjectForm, AchievementForm, CategoryForm, 
-                  CommentForm, ContactForm, ProfileForm)
+                  CommentForm, ContactForm, ProfileForm, BulkProjectForm)
+from chunked_uploads import create_upload, get_upload_status, write_chunk, complete_upload, claim_upload
+from sqlite_profile import serialized_write
+from view_tracking import record_view
+from freeze import is_freezing
+from suggest import MAX_QUERY_LENGTH, suggest
+from bulk_actions import DELETE_ACTION, apply_action, delete_projects, remove_files_later
+from metrics import render_metrics
 from utils import save_uploaded_file, delete_file, format_date, format_datetime, truncate_text, generate_linkedin_share_url
 
 # Create blueprints
 main_bp = Blueprint('main', __name__)
 auth_bp = Blueprint('auth', __name__)
 admin_bp = Blueprint('admin', __name__)
+api_bp = Blueprint('api', __name__)
 
 # Template filters
 @main_bp.app_template_filter('format_date')
@@ -112,6 +126,9 @@ def project_detail(id):
         if not current_user.is_authenticated or not current_user.is_admin:
             flash('Projeto não encontrado.', 'error')
             return redirect(url_for('main.projects'))
+    elif not is_freezing():
+        # Frozen pages count their views through the beacon endpoint instead
+        record_view(project.id)
     
     # Get comments
     comments = Comment.query.filter_by(project_id=id).order_by(desc(Comment.created_at)).all()
@@ -180,19 +197,92 @@ def contact():
             flash('Mensagem enviada com sucesso! Retornaremos em breve.', 'success')
         except Exception as e:
             # Even if email fails, message is saved in database
-            current_app.logger.warning(f'Email não pôde ser enviado: {e}')
+            current_app.logger.warning('Email não pôde ser enviado: %s', e)
             flash('Mensagem salva! Para receber por email, configure as credenciais SMTP.', 'info')
         
         return redirect(url_for('main.contact'))
     
     return render_template('contact.html', form=form)
 
+# Profile activity feed: likes and comments merged, newest first
+ACTIVITY_PAGE_SIZE = 10
+
+def _activity_arm(model, kind, content, user_id, after, limit):
+    """One user's likes or comments after the cursor, newest first, limited before the merge"""
+    query = select(
+        literal(kind).label('kind'), model.id.label('id'), model.project_id,
+        model.created_at, content.label('content')
+    ).where(model.user_id == user_id)
+    if after:
+        created_at, after_kind, after_id = after
+        # Rows sort by (created_at, kind, id) descending; the kind is constant in each arm
+        if kind > after_kind:
+            query = query.where(model.created_at < created_at)
+        elif kind < after_kind:
+            query = query.where(model.created_at <= created_at)
+        else:
+            query = query.where(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < after_id)
+            ))
+    return query.order_by(desc(model.created_at), desc(model.id)).limit(limit)
+
+def _activity_page(user_id, cursor=None, limit=ACTIVITY_PAGE_SIZE):
+    """
+    One page of a user's activity with its projects, in a single query
+    
+    Each arm reads at most limit + 1 rows from its (user_id, created_at) index,
+    so a page costs the same however long the history is.
+    """
+    after = _decode_activity_cursor(cursor) if cursor else None
+    arms = [
+        _activity_arm(Like, 'like', null(), user_id, after, limit + 1).subquery(),
+        _activity_arm(Comment, 'comment', Comment.content, user_id, after, limit + 1).subquery(),
+    ]
+    activity = union_all(*[select(arm) for arm in arms]).subquery()
+    rows = db.session.execute(
+        select(activity, Project.title.label('project_title'), Project.image_url.label('project_image'))
+        .join(Project, Project.id == activity.c.project_id)
+        .order_by(desc(activity.c.created_at), desc(activity.c.kind), desc(activity.c.id))
+        .limit(limit + 1)
+    ).all()
+    items = rows[:limit]
+    next_cursor = _encode_activity_cursor(items[-1]) if len(rows) > limit else None
+    return items, next_cursor
+
+def _encode_activity_cursor(item):
+    raw = f"{item.created_at.isoformat()}|{item.kind}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_activity_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, kind, item_id = raw.split('|')
+    return datetime.fromisoformat(created_at), kind, int(item_id)
+
 @main_bp.route('/profile')
 @login_required
 def profile():
     """User profile page"""
     form = ProfileForm(obj=current_user)
-    return render_template('profile.html', form=form)
+    activity, next_cursor = _activity_page(current_user.id)
+    stats = {
+        'comments': db.session.query(db.func.count(Comment.id)).filter(Comment.user_id == current_user.id).scalar(),
+        'likes': db.session.query(db.func.count(Like.id)).filter(Like.user_id == current_user.id).scalar(),
+    }
+    return render_template('profile.html', form=form, activity=activity, next_cursor=next_cursor, stats=stats)
+
+@main_bp.route('/profile/activity')
+@login_required
+def profile_activity():
+    """Next page of the profile activity feed, as rendered items"""
+    try:
+        activity, next_cursor = _activity_page(current_user.id, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Cursor inválido.'}), 400
+    return jsonify({
+        'html': render_template('profile_activity.html', activity=activity),
+        'next_cursor': next_cursor,
+    })
 
 @main_bp.route('/profile/edit', methods=['POST'])
 @login_required
@@ -205,17 +295,19 @@ def edit_profile():
         current_user.bio = form.bio.data
         
         # Handle profile image upload
+        old_image = None
         if form.profile_image.data:
-            # Delete old image
-            if current_user.profile_image:
-                delete_file(current_user.profile_image)
-            
-            # Save new image
             filename = save_uploaded_file(form.profile_image.data, max_size=(300, 300))
             if filename:
+                old_image = current_user.profile_image
                 current_user.profile_image = filename
         
         db.session.commit()
+        
+        # Only remove the old image once the new one is saved and committed
+        if old_image:
+            delete_file(old_image)
+        
         flash('Perfil atualizado com sucesso!', 'success')
     else:
         for field, errors in form.errors.items():
@@ -227,6 +319,7 @@ def edit_profile():
 # AJAX routes for interactions
 @main_bp.route('/api/like/<int:project_id>', methods=['POST'])
 @login_required
+@serialized_write
 def toggle_like(project_id):
     """Toggle like for a project"""
     project = Project.query.get_or_404(project_id)
@@ -250,6 +343,7 @@ def toggle_like(project_id):
 
 @main_bp.route('/api/comment/<int:project_id>', methods=['POST'])
 @login_required
+@serialized_write
 def add_comment(project_id):
     """Add comment to a project"""
     project = Project.query.get_or_404(project_id)
@@ -278,6 +372,257 @@ def add_comment(project_id):
     
     return jsonify({'success': False, 'errors': form.errors}), 400
 
+@main_bp.route('/api/suggest')
+def api_suggest():
+    """Search box suggestions: projects, tags and categories whose words start with q"""
+    query = request.args.get('q', '')[:MAX_QUERY_LENGTH]
+    suggestions = []
+    for (kind, key), label in suggest(query):
+        if kind == 'project':
+            url = url_for('main.project_detail', id=key)
+        elif kind == 'tag':
+            url = url_for('main.projects', tag=key)
+        else:
+            url = url_for('main.projects', category=key)
+        suggestions.append({'type': kind, 'label': label, 'url': url})
+    
+    response = jsonify({'query': query, 'suggestions': suggestions})
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+# Sitemap and Atom feed, pre-rendered by feeds.FeedStore
+def _feed_document(name):
+    """Serve a pre-rendered document, answering conditional requests without reading it"""
+    document = current_app.extensions['feed_store'].document(name)
+    if document is None:
+        abort(404)
+    path, content_type, etag, last_modified = document
+    
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    try:
+        response = send_file(path, mimetype=content_type, conditional=False, etag=False)
+    except FileNotFoundError:
+        # A shard dropped by a rebuild that finished after the manifest was read
+        abort(404)
+    _set_validators(response, etag, last_modified)
+    return response
+
+@main_bp.route('/sitemap.xml')
+def sitemap():
+    """Sitemap, or a sitemap index once there are more than SITEMAP_MAX_URLS pages"""
+    return _feed_document('sitemap.xml')
+
+@main_bp.route('/sitemap-<int:number>.xml')
+def sitemap_shard(number):
+    """One shard of a sharded sitemap"""
+    return _feed_document(f'sitemap-{number}.xml')
+
+@main_bp.route('/feed.atom')
+def feed():
+    """Atom feed of the latest projects and achievements"""
+    return _feed_document('feed.atom')
+
+API_PROJECT_FIELDS = ('title', 'description', 'content', 'image_url', 'video_url', 'project_url',
+                      'github_url', 'is_featured', 'category_id', 'created_at', 'updated_at')
+API_PROJECT_INCLUDES = ('tags', 'category')
+API_MAX_LIMIT = 100
+
+def _api_error(message, status):
+    return jsonify({'error': message}), status
+
+def _api_list_arg(name, allowed):
+    """Parse a comma-separated query argument, rejecting unknown values"""
+    values = [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+    unknown = [value for value in values if value not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown {name}: {', '.join(unknown)}")
+    return values
+
+def _api_fields():
+    """Requested project fields; id is always returned, so asking for it is accepted and ignored"""
+    fields = _api_list_arg('fields', ('id',) + API_PROJECT_FIELDS)
+    if not fields:
+        return list(API_PROJECT_FIELDS)
+    return [name for name in dict.fromkeys(fields) if name != 'id']
+
+def _selection_tag(fields, includes):
+    """Short digest of a field/include selection, independent of the order it was given in"""
+    selection = f"{','.join(sorted(fields))}|{','.join(sorted(set(includes)))}"
+    return hashlib.sha1(selection.encode()).hexdigest()[:16]
+
+def _http_datetime(value):
+    """Naive UTC datetime from the database to an aware one for HTTP headers"""
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+def _not_modified(etag, last_modified):
+    """304 response if the client's validators match, without building the body"""
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    response = current_app.response_class(status=304)
+    _set_validators(response, etag, last_modified)
+    return response
+
+def _set_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'public, no-cache'
+
+def _encode_cursor(project):
+    raw = f"{project.created_at.isoformat()}|{project.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, project_id = raw.split('|')
+    return datetime.fromisoformat(created_at), int(project_id)
+
+def _api_query(fields, includes):
+    """Published projects loading only the requested columns (and relationships)"""
+    columns = {'id', 'created_at', 'updated_at', *fields}
+    if 'category' in includes:
+        columns.add('category_id')
+    query = Project.query.filter_by(is_published=True).options(
+        load_only(*[getattr(Project, name) for name in columns])
+    )
+    if 'category' in includes:
+        query = query.options(joinedload(Project.category))
+    if 'tags' not in includes:
+        # Project.tags is eager (subquery) by default; skip it when not requested
+        query = query.options(lazyload(Project.tags))
+    return query
+
+def _serialize_project(project, fields, includes):
+    data = {'id': project.id}
+    for name in fields:
+        value = getattr(project, name)
+        if name in ('image_url', 'video_url') and value:
+            value = url_for('main.uploaded_file', filename=value, _external=True)
+        elif isinstance(value, datetime):
+            value = value.isoformat() + 'Z'
+        data[name] = value
+    if 'tags' in includes:
+        data['tags'] = [tag.name for tag in project.tags]
+    if 'category' in includes:
+        category = project.category
+        data['category'] = {'id': category.id, 'name': category.name, 'color': category.color} if category else None
+    return data
+
+@api_bp.route('/projects')
+def api_projects():
+    """Published projects, newest first, with cursor pagination"""
+    try:
+        fields = _api_fields()
+        includes = _api_list_arg('include', API_PROJECT_INCLUDES)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), API_MAX_LIMIT)
+    except ValueError as e:
+        return _api_error(str(e), 400)
+    cursor = request.args.get('cursor')
+    try:
+        after = _decode_cursor(cursor) if cursor else None
+    except (ValueError, UnicodeDecodeError):
+        return _api_error('Invalid cursor', 400)
+    
+    filters = [Project.is_published == True]
+    category_id = request.args.get('category', type=int)
+    if category_id:
+        filters.append(Project.category_id == category_id)
+    tag = request.args.get('tag')
+    if tag:
+        filters.append(Project.tags.any(Tag.name == tag))
+    
+    # Validators from one aggregate over the filtered set: any edit, addition or
+    # removal changes the newest updated_at or the count
+    newest, total = db.session.query(db.func.max(Project.updated_at), db.func.count(Project.id)).filter(*filters).one()
+    last_modified = _http_datetime(newest) if newest else None
+    other_args = sorted((key, value) for key, value in request.args.items(multi=True)
+                        if key not in ('fields', 'include'))
+    fingerprint = f"{newest}|{total}|{_selection_tag(fields, includes)}|{other_args}"
+    etag = hashlib.sha1(fingerprint.encode()).hexdigest()
+    
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    query = _api_query(fields, includes).filter(*filters[1:])
+    if after:
+        created_at, project_id = after
+        query = query.filter(or_(Project.created_at < created_at,
+                                 and_(Project.created_at == created_at, Project.id < project_id)))
+    projects = query.order_by(desc(Project.created_at), desc(Project.id)).limit(limit + 1).all()
+    
+    has_more = len(projects) > limit
+    projects = projects[:limit]
+    response = jsonify({
+        'data': [_serialize_project(project, fields, includes) for project in projects],
+        'next_cursor': _encode_cursor(projects[-1]) if has_more else None,
+    })
+    _set_validators(response, etag, last_modified)
+    return response
+
+@api_bp.route('/projects/<int:id>')
+def api_project(id):
+    """A single published project"""
+    try:
+        fields = _api_fields()
+        includes = _api_list_arg('include', API_PROJECT_INCLUDES)
+    except ValueError as e:
+        return _api_error(str(e), 400)
+    
+    # Only the timestamp is read before deciding between 304 and a full response
+    updated_at = db.session.query(db.func.coalesce(Project.updated_at, Project.created_at)).filter(
+        Project.id == id, Project.is_published == True
+    ).scalar()
+    if updated_at is None:
+        return _api_error('Project not found', 404)
+    
+    last_modified = _http_datetime(updated_at)
+    etag = f"p{id}-{updated_at.timestamp():.6f}-{_selection_tag(fields, includes)}"
+    
+    not_modified = _not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
+    
+    project = _api_query(fields, includes).filter(Project.id == id).first()
+    if project is None:
+        # Unpublished or deleted since the timestamp was read
+        return _api_error('Project not found', 404)
+    response = jsonify({'data': _serialize_project(project, fields, includes)})
+    _set_validators(response, etag, last_modified)
+    return response
+
+@api_bp.route('/projects/<int:id>/views', methods=['POST'])
+def api_project_view(id):
+    """View beacon sent by frozen project pages"""
+    published = db.session.query(Project.id).filter(Project.id == id, Project.is_published == True).scalar()
+    if published is None:
+        return _api_error('Project not found', 404)
+    record_view(id)
+    return '', 204
+
+@api_bp.route('/session')
+def api_session():
+    """Per-visitor state used to hydrate frozen pages"""
+    data = {'authenticated': current_user.is_authenticated}
+    if current_user.is_authenticated:
+        data.update(name=current_user.name, is_admin=current_user.is_admin, csrf_token=generate_csrf())
+        project_id = request.args.get('project', type=int)
+        if project_id:
+            data['liked'] = Like.query.filter_by(user_id=current_user.id, project_id=project_id).first() is not None
+    
+    response = jsonify(data)
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
 # Authentication routes
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -370,7 +715,28 @@ def dashboard():
     recent_messages = ContactMessage.query.order_by(desc(ContactMessage.created_at)).limit(5).all()
     
     # Most liked projects
-    popular_projects = Project.query.join(Like).group_by(Project.id).order_by(desc(db.func.count(Like.id))).limit(5).all()
+    # (aggregated from the likes index first, so projects are only read by primary key)
+    like_counts = db.session.query(Like.project_id, db.func.count().label('likes')).group_by(Like.project_id).subquery()
+    popular_projects = (Project.query.join(like_counts, Project.id == like_counts.c.project_id)
+                        .order_by(desc(like_counts.c.likes)).limit(5).all())
+    
+    # Views per day over the last two weeks (flushed in batches by view_tracking)
+    today = datetime.utcnow().date()
+    first_day = today - timedelta(days=13)
+    daily_views = dict(db.session.query(ProjectViewDay.day, db.func.sum(ProjectViewDay.views))
+                       .filter(ProjectViewDay.day >= first_day)
+                       .group_by(ProjectViewDay.day).all())
+    views_by_day = [(first_day + timedelta(days=i), daily_views.get(first_day + timedelta(days=i), 0))
+                    for i in range(14)]
+    
+    # Most viewed projects in the last 30 days
+    views_total = db.func.sum(ProjectViewDay.views).label('views')
+    most_viewed = (db.session.query(Project, views_total)
+                   .join(ProjectViewDay)
+                   .filter(ProjectViewDay.day >= today - timedelta(days=29))
+                   .group_by(Project.id)
+                   .order_by(desc(views_total))
+                   .limit(5).all())
     
     stats = {
         'total_projects': total_projects,
@@ -379,7 +745,8 @@ def dashboard():
         'total_users': total_users,
         'total_comments': total_comments,
         'total_likes': total_likes,
-        'unread_messages': unread_messages
+        'unread_messages': unread_messages,
+        'views_14_days': sum(views for _, views in views_by_day)
     }
     
     return render_template('admin/dashboard.html',
@@ -387,7 +754,20 @@ def dashboard():
                          recent_projects=recent_projects,
                          recent_comments=recent_comments,
                          recent_messages=recent_messages,
-                         popular_projects=popular_projects)
+                         popular_projects=popular_projects,
+                         views_by_day=views_by_day,
+                         max_daily_views=max([views for _, views in views_by_day] + [1]),
+                         most_viewed=most_viewed)
+
+def _admin_projects_query(search):
+    """Admin projects, optionally filtered by a search term"""
+    query = Project.query
+    if search:
+        query = query.filter(or_(
+            Project.title.contains(search),
+            Project.description.contains(search)
+        ))
+    return query
 
 @admin_bp.route('/projects')
 @login_required
@@ -395,12 +775,43 @@ def dashboard():
 def projects_list():
     """Admin projects list"""
     page = request.args.get('page', 1, type=int)
+    search = request.args.get('search', '')
     
-    projects = Project.query.order_by(desc(Project.created_at)).paginate(
+    projects = _admin_projects_query(search).order_by(desc(Project.created_at)).paginate(
         page=page, per_page=10, error_out=False
     )
+    bulk_form = BulkProjectForm(search=search)
     
-    return render_template('admin/projects_list.html', projects=projects)
+    return render_template('admin/projects_list.html', projects=projects, bulk_form=bulk_form, search=search)
+
+@admin_bp.route('/projects/bulk', methods=['POST'])
+@login_required
+@admin_required
+@serialized_write
+def bulk_projects():
+    """Publish, unpublish, feature or delete many projects in one transaction"""
+    form = BulkProjectForm()
+    search = form.search.data or ''
+    back = redirect(url_for('admin.projects_list', search=search or None))
+    
+    if not form.validate_on_submit():
+        flash('Ação em lote inválida.', 'error')
+        return back
+    
+    if form.apply_to_all.data:
+        project_ids = [project_id for project_id, in _admin_projects_query(search).with_entities(Project.id)]
+    else:
+        project_ids = request.form.getlist('ids', type=int)
+    if not project_ids:
+        flash('Selecione ao menos um projeto.', 'warning')
+        return back
+    
+    count = apply_action(form.action.data, project_ids)
+    if form.action.data == DELETE_ACTION:
+        flash(f'{count} projeto(s) excluído(s) com sucesso!', 'success')
+    else:
+        flash(f'{count} projeto(s) atualizado(s) com sucesso!', 'success')
+    return back
 
 @admin_bp.route('/projects/new', methods=['GET', 'POST'])
 @login_required
@@ -431,7 +842,11 @@ def new_project():
             if filename:
                 project.image_url = filename
         
-        if form.video.data:
+        if form.video_upload_id.data:
+            filename = claim_upload(form.video_upload_id.data)
+            if filename:
+                project.video_url = filename
+        elif form.video.data:
             filename = save_uploaded_file(form.video.data)
             if filename:
                 project.video_url = filename
@@ -480,20 +895,23 @@ def edit_project(id):
         project.is_featured = form.is_featured.data
         project.updated_at = datetime.utcnow()
         
-        # Handle file uploads
+        # Handle file uploads; replaced files are removed after the commit
+        replaced_files = []
         if form.image.data:
-            if project.image_url:
-                delete_file(project.image_url)
             filename = save_uploaded_file(form.image.data)
             if filename:
+                replaced_files.append(project.image_url)
                 project.image_url = filename
         
-        if form.video.data:
-            if project.video_url:
-                delete_file(project.video_url)
+        if form.video_upload_id.data:
+            filename = claim_upload(form.video_upload_id.data)
+        elif form.video.data:
             filename = save_uploaded_file(form.video.data)
-            if filename:
-                project.video_url = filename
+        else:
+            filename = None
+        if filename:
+            replaced_files.append(project.video_url)
+            project.video_url = filename
         
         # Handle tags
         project.tags.clear()
@@ -508,6 +926,10 @@ def edit_project(id):
         
         db.session.commit()
         
+        for old_file in replaced_files:
+            if old_file:
+                delete_file(old_file)
+        
         flash('Projeto atualizado com sucesso!', 'success')
         return redirect(url_for('admin.projects_list'))
     
@@ -520,18 +942,108 @@ def delete_project(id):
     """Delete project"""
     project = Project.query.get_or_404(id)
     
-    # Delete associated files
-    if project.image_url:
-        delete_file(project.image_url)
-    if project.video_url:
-        delete_file(project.video_url)
-    
-    db.session.delete(project)
+    # Likes and comments are removed by the database; files after the commit
+    _, files = delete_projects([project.id])
     db.session.commit()
+    remove_files_later(files)
     
     flash('Projeto excluído com sucesso!', 'success')
     return redirect(url_for('admin.projects_list'))
 
+# Chunked, resumable video uploads
+def _check_csrf_header():
+    """Validate the CSRF token sent by the upload client in X-CSRFToken"""
+    if not current_app.config.get('WTF_CSRF_ENABLED', True):
+        return None
+    try:
+        validate_csrf(request.headers.get('X-CSRFToken'))
+    except ValidationError:
+        return jsonify({'error': 'Token CSRF inválido.'}), 400
+    return None
+
+@admin_bp.route('/uploads', methods=['POST'])
+@login_required
+@admin_required
+def start_upload():
+    """Start a chunked upload: expects JSON with filename, size and optional sha256"""
+    error = _check_csrf_header()
+    if error:
+        return error
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        status = create_upload(data.get('filename'), data.get('size'), data.get('sha256'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(status), 201
+
+@admin_bp.route('/uploads/<upload_id>')
+@login_required
+@admin_required
+def upload_status(upload_id):
+    """Upload status with the chunks received so far, used to resume"""
+    status = get_upload_status(upload_id)
+    if status is None:
+        return jsonify({'error': 'Upload não encontrado.'}), 404
+    return jsonify(status)
+
+@admin_bp.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+@admin_required
+def upload_chunk(upload_id, index):
+    """Receive one chunk as the raw request body, checked against X-Chunk-SHA256"""
+    error = _check_csrf_header()
+    if error:
+        return error
+    
+    try:
+        status = write_chunk(upload_id, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(status)
+
+@admin_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+@admin_required
+def finish_upload(upload_id):
+    """Assemble the upload; the returned upload_id can then be attached to a project"""
+    error = _check_csrf_header()
+    if error:
+        return error
+    
+    try:
+        filename = complete_upload(upload_id)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    return jsonify({'upload_id': upload_id, 'filename': filename})
+
+# Monitoring
+@main_bp.route('/metrics')
+def metrics():
+    """Prometheus metrics, aggregated over every worker"""
+    registry = current_app.extensions.get('metrics')
+    if registry is None:
+        return render_template('404.html'), 404
+    
+    # Closed unless a token is configured
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        return 'Forbidden: set METRICS_TOKEN to enable /metrics', 403
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return 'Unauthorized', 401, {'WWW-Authenticate': 'Bearer'}
+    
+    return render_metrics(registry.collect()), 200, {
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+        'Cache-Control': 'no-store',
+    }
+
 # Error handlers
 @main_bp.app_errorhandler(404)
 def not_found_error(error):
@@ -0,0 +1,308 @@
+import json
+import re
+import sys
+from datetime import datetime
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from sqlalchemy import Column, DateTime, MetaData, String, Table, event, inspect, select
+from sqlalchemy.schema import CreateIndex
+from app import db
+from db_routing import PRIMARY_ENVIRON_KEY
+from models import Project, Category, Tag, User
+
+schema_cli = AppGroup('schema', help='Database migrations and query plan checks.')
+
+# Applied migrations are recorded here, outside the models' metadata
+migrations_table = Table(
+    'schema_migrations', MetaData(),
+    Column('id', String(100), primary_key=True),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+def _add_delete_cascades(engine, echo):
+    """
+    Recreate foreign keys declared with ondelete on the models but missing it in the database
+
+    Only Postgres can alter a foreign key in place. The new constraint is added
+    NOT VALID and validated afterwards, so the table is not locked against writes
+    while existing rows are checked. SQLite tables keep their old constraints,
+    which it does not enforce anyway; bulk_actions deletes dependent rows itself there.
+    """
+    if engine.dialect.name != 'postgresql':
+        echo("  skipped: foreign keys can only be altered on Postgres")
+        return set()
+
+    existing = inspect(engine)
+    tables = set()
+    for table in db.metadata.sorted_tables:
+        for fk in table.foreign_keys:
+            if not fk.ondelete:
+                continue
+            column = fk.parent.name
+            for reflected in existing.get_foreign_keys(table.name):
+                if reflected['constrained_columns'] != [column]:
+                    continue
+                if (reflected.get('options') or {}).get('ondelete', '').upper() == fk.ondelete.upper():
+                    continue
+                name = reflected['name']
+                echo(f"  {table.name}.{column}: ON DELETE {fk.ondelete}")
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" DROP CONSTRAINT "{name}"')
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE "{table.name}" ADD CONSTRAINT "{name}" FOREIGN KEY ("{column}") '
+                        f'REFERENCES "{fk.column.table.name}" ("{fk.column.name}") '
+                        f'ON DELETE {fk.ondelete} NOT VALID'
+                    )
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(f'ALTER TABLE "{table.name}" VALIDATE CONSTRAINT "{name}"')
+                tables.add(table.name)
+    return tables
+
+
+# Each migration is a list of indexes to create, by name (they are declared on
+# the models, so create_all already builds them on a new database), or a
+# function of (engine, echo) returning the tables it changed
+MIGRATIONS = [
+    ('0001_hot_path_indexes', [
+        'ix_projects_published_featured_created',
+        'ix_projects_published_created',
+        'ix_projects_category_published_created',
+        'ix_projects_created',
+        'ix_achievements_published_created',
+        'ix_comments_project_created',
+        'ix_comments_user_created',
+        'ix_comments_created',
+        'ix_likes_project',
+        'ix_project_tags_tag_project',
+        'ix_project_view_days_day',
+        'ix_contact_messages_read_created',
+        'ix_contact_messages_created',
+    ]),
+    ('0002_project_delete_cascades', _add_delete_cascades),
+    ('0003_feed_indexes', [
+        'ix_projects_published_updated',
+    ]),
+    ('0004_activity_feed_indexes', [
+        'ix_likes_user_created',
+    ]),
+]
+
+# Small lookup tables that routes intentionally read in full (filter menus, form choices)
+FULL_SCAN_ALLOWED = {'categories', 'tags'}
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def _indexes_by_name():
+    return {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+
+
+def applied_migrations(connection):
+    migrations_table.create(connection, checkfirst=True)
+    return set(connection.execute(select(migrations_table.c.id)).scalars())
+
+
+def _create_index(engine, index):
+    """Create one index if missing; on Postgres without locking writes to the table"""
+    if engine.dialect.name == 'postgresql':
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+        ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+        # CONCURRENTLY cannot run inside a transaction block
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql(ddl)
+    else:
+        with engine.begin() as connection:
+            index.create(connection, checkfirst=True)
+
+
+def run_migrations(engine, echo=print):
+    """Apply pending migrations in order; returns the ids applied"""
+    with engine.begin() as connection:
+        done = applied_migrations(connection)
+
+    indexes = _indexes_by_name()
+    applied = []
+    for migration_id, steps in MIGRATIONS:
+        if migration_id in done:
+            continue
+        if callable(steps):
+            echo(f"{migration_id}:")
+            tables = steps(engine, echo)
+        else:
+            tables = set()
+            for name in steps:
+                echo(f"{migration_id}: creating {name}")
+                _create_index(engine, indexes[name])
+                tables.add(indexes[name].table.name)
+
+        with engine.begin() as connection:
+            if engine.dialect.name == 'postgresql':
+                # Refresh planner statistics so the new indexes are picked up right away
+                for table in sorted(tables):
+                    connection.exec_driver_sql(f'ANALYZE "{table}"')
+            connection.execute(migrations_table.insert().values(id=migration_id, applied_at=datetime.utcnow()))
+        applied.append(migration_id)
+    return applied
+
+
+def full_scans(connection, statement, parameters):
+    """Tables a statement reads with a full table scan, according to EXPLAIN"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        scans = set()
+        for row in rows:
+            match = SQLITE_SCAN.match(row[-1])
+            # Scans of subqueries (anon_1) are not table scans
+            if match and match.group(1) in db.metadata.tables:
+                scans.add(match.group(1))
+        return scans
+
+    if dialect == 'postgresql':
+        # With sequential scans priced out, any Seq Scan left has no usable index
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = set()
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                scans.add(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return scans
+
+    raise click.ClickException(f'Query plan checks are not supported on {dialect}.')
+
+
+def _ignore_statistics(connection):
+    """
+    Make SQLite plan without ANALYZE statistics for the rest of the transaction
+
+    On a small database the statistics make a scan look cheaper than an index,
+    which would hide missing indexes; the plans checked are the ones the schema
+    guarantees. Postgres gets the same effect from enable_seqscan.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    if connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").first():
+        connection.exec_driver_sql("DELETE FROM sqlite_stat1")
+        # Reloads the statistics the planner uses from the (now empty) table
+        connection.exec_driver_sql("ANALYZE sqlite_schema")
+
+
+def _reload_statistics(connection):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql("ANALYZE sqlite_schema")
+        connection.commit()
+
+
+def _route_urls():
+    """GET routes to check, with ids taken from the current data"""
+    project = Project.query.filter_by(is_published=True).first()
+    category = Category.query.first()
+    tag = Tag.query.first()
+
+    urls = [
+        url_for('main.index'),
+        url_for('main.projects'),
+        url_for('main.projects', page=2),
+        url_for('main.about'),
+        url_for('main.profile'),
+        url_for('main.profile_activity'),
+        url_for('main.sitemap'),
+        url_for('main.feed'),
+        url_for('api.api_projects'),
+        url_for('admin.dashboard'),
+        url_for('admin.projects_list'),
+    ]
+    if project:
+        urls += [url_for('main.project_detail', id=project.id),
+                 url_for('api.api_project', id=project.id),
+                 url_for('api.api_session', project=project.id)]
+    if category:
+        urls += [url_for('main.projects', category=category.id),
+                 url_for('api.api_projects', category=category.id)]
+    if tag:
+        urls += [url_for('main.projects', tag=tag.name),
+                 url_for('api.api_projects', tag=tag.name)]
+    return urls
+
+
+def check_query_plans(app):
+    """
+    Request each public, API and admin page and EXPLAIN every SELECT it runs
+
+    Returns a list of (url, tables, statement) for queries doing full table scans.
+    Pages are requested as an admin so admin-only and logged-in pages are covered.
+    Text search (LIKE '%term%') is left out: it cannot use a b-tree index.
+    """
+    admin = User.query.filter_by(is_admin=True).first()
+    if admin is None:
+        raise click.ClickException('An admin user is needed to check the admin pages.')
+    with app.test_request_context():
+        urls = _route_urls()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+
+    failures = []
+    for url in urls:
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            response = client.get(url, environ_overrides={PRIMARY_ENVIRON_KEY: True})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        if response.status_code != 200:
+            failures.append((url, {f'HTTP {response.status_code}'}, ''))
+            continue
+
+        with db.engine.connect() as connection:
+            _ignore_statistics(connection)
+            try:
+                for statement, parameters in statements:
+                    scans = full_scans(connection, statement, parameters) - FULL_SCAN_ALLOWED
+                    if scans:
+                        failures.append((url, scans, statement))
+            finally:
+                connection.rollback()
+                _reload_statistics(connection)
+    return failures
+
+
+@schema_cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    applied = run_migrations(db.engine, echo=click.echo)
+    click.echo(f"Applied {len(applied)} migrations" if applied else "Schema is up to date")
+
+
+@schema_cli.command('status')
+def status_command():
+    """List migrations and whether they are applied."""
+    with db.engine.begin() as connection:
+        done = applied_migrations(connection)
+    for migration_id, _ in MIGRATIONS:
+        click.echo(f"[{'x' if migration_id in done else ' '}] {migration_id}")
+
+
+@schema_cli.command('check-plans')
+def check_plans_command():
+    """Fail if any page runs a query that scans a whole table."""
+    failures = check_query_plans(current_app._get_current_object())
+    for url, tables, statement in failures:
+        click.echo(f"FULL SCAN {', '.join(sorted(tables))} on {url}:\n    {' '.join(statement.split())}\n")
+    if failures:
+        click.echo(f"{len(failures)} queries without a usable index")
+        sys.exit(1)
+    click.echo("No full table scans")
@@ -0,0 +1,29 @@
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def locked(directory):
+    """Exclusive lock on a directory shared by every worker (and CLI process) on the host"""
+    with open(os.path.join(directory, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_atomic(path, data):
+    """Write bytes through a temporary name unique to this process and thread, then rename"""
+    tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def instance_suffix(app):
+    """Short stable id of an app instance, for files shared outside its own directory"""
+    return hashlib.sha1(os.path.realpath(app.instance_path).encode()).hexdigest()[:12]
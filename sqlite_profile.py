@@ -0,0 +1,131 @@
+import functools
+import random
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+# Applied to every new SQLite connection
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',        # readers no longer block the writer (and vice versa)
+    'synchronous': 'NORMAL',      # safe with WAL, fsync only at checkpoints
+    'busy_timeout': 5000,         # ms to wait for the write lock before "database is locked"
+    'cache_size': -64000,         # 64 MB page cache per connection
+    'mmap_size': 268435456,       # 256 MB memory-mapped reads
+    'temp_store': 'MEMORY',
+}
+
+# Serializes writers inside one worker so threads do not pile up on the file lock
+_write_lock = threading.Lock()
+
+
+def is_sqlite_uri(uri):
+    """Check if a database URI points to SQLite"""
+    return uri.startswith('sqlite')
+
+
+def sqlite_engine_options(busy_timeout_ms=DEFAULT_PRAGMAS['busy_timeout']):
+    """
+    Engine options for SQLite
+
+    pool_recycle/pool_pre_ping only matter for server databases; a small pool of
+    long-lived connections keeps the per-connection page cache and mmap warm.
+    """
+    return {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'connect_args': {
+            'timeout': busy_timeout_ms / 1000,
+            'check_same_thread': False,
+        },
+    }
+
+
+def init_sqlite(app, db):
+    """Apply the SQLite profile (pragmas and explicit transactions) to the app's engine"""
+    if not app.config.get('SQLITE_PROFILE_ENABLED'):
+        return
+
+    pragmas = {**DEFAULT_PRAGMAS, **app.config.get('SQLITE_PRAGMAS', {})}
+
+    with app.app_context():
+        engine = db.engine
+
+    if engine.dialect.name != 'sqlite':
+        return
+
+    in_memory = engine.url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN itself so write transactions can be IMMEDIATE
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if in_memory and name in ('journal_mode', 'mmap_size'):
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin_transaction(connection):
+        # IMMEDIATE takes the write lock up front (waiting up to busy_timeout) instead
+        # of failing when a read transaction later tries to upgrade to a write
+        if has_request_context() and g.get('_sqlite_write'):
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            connection.exec_driver_sql("BEGIN")
+
+    session_class = db.session.session_factory.class_
+
+    @event.listens_for(session_class, 'after_commit')
+    @event.listens_for(session_class, 'after_rollback')
+    def end_write_transaction(session):
+        # Only the view's first transaction is IMMEDIATE; reads after its commit
+        # (e.g. counts for the JSON response) must not take the write lock again
+        if has_request_context():
+            g._sqlite_write = False
+
+    app.extensions['sqlite_profile'] = pragmas
+
+
+def _is_locked_error(error):
+    message = str(error.orig if hasattr(error, 'orig') else error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def serialized_write(f):
+    """
+    Decorator for views that write to the database
+
+    Keep slow side effects (SMTP, password hashing) out of decorated views: on
+    SQLite the view runs under the worker's write lock inside a BEGIN IMMEDIATE
+    transaction, and is retried with backoff if the database stays locked past the
+    busy timeout. On other databases it is a no-op.
+    """
+    @functools.wraps(f)
+    def decorated_function(*args, **kwargs):
+        from app import db
+
+        if 'sqlite_profile' not in current_app.extensions or request.method in ('GET', 'HEAD'):
+            return f(*args, **kwargs)
+
+        retries = current_app.config.get('SQLITE_WRITE_RETRIES', 3)
+        for attempt in range(retries + 1):
+            with _write_lock:
+                # End the read transaction opened before the view (e.g. by the user loader)
+                db.session.rollback()
+                g._sqlite_write = True
+                try:
+                    return f(*args, **kwargs)
+                except OperationalError as e:
+                    db.session.rollback()
+                    if not _is_locked_error(e) or attempt == retries:
+                        raise
+                finally:
+                    g._sqlite_write = False
+            # Back off without the lock, so other writers in this worker can go ahead
+            current_app.logger.warning("Database locked, retrying write (%d/%d)", attempt + 1, retries)
+            time.sleep(0.05 * (2 ** attempt) + random.uniform(0, 0.05))
+    return decorated_function
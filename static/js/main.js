@@ -463,7 +463,11 @@ function initLikeSystem() {
                 },
                 credentials: 'same-origin'
             })
-            .then(response => response.json())
+            .then(response => response.json().then(data => {
+                // e.g. 429 from the rate limiter
+                if (!response.ok) throw new Error(data.error || response.statusText);
+                return data;
+            }))
             .then(data => {
                 if (data.liked !== undefined) {
                     this.classList.toggle('active', data.liked);
@@ -482,7 +486,7 @@ function initLikeSystem() {
                 this.classList.toggle('active');
                 countSpan.textContent = currentCount;
                 
-                showNotification('Erro ao curtir projeto', 'error');
+                showNotification(error.message || 'Erro ao curtir projeto', 'error');
             });
         });
     });
@@ -530,7 +534,7 @@ function initCommentSystem() {
                 
                 showNotification('Comentário adicionado com sucesso!', 'success');
             } else {
-                showNotification('Erro ao adicionar comentário', 'error');
+                showNotification(data.error || 'Erro ao adicionar comentário', 'error');
                 console.error('Comment errors:', data.errors);
             }
         })
@@ -585,19 +589,7 @@ function initSearch() {
     
     if (!searchForm || !searchInput) return;
     
-    // Auto-complete functionality (if needed)
-    let searchTimeout;
-    searchInput.addEventListener('input', function() {
-        clearTimeout(searchTimeout);
-        const query = this.value.trim();
-        
-        if (query.length > 2) {
-            searchTimeout = setTimeout(() => {
-                // Implement autocomplete if needed
-                console.log('Searching for:', query);
-            }, 300);
-        }
-    });
+    initSuggestions(searchForm, searchInput);
     
     // Highlight search terms in results
     const searchQuery = new URLSearchParams(window.location.search).get('search');
@@ -617,6 +609,101 @@ function initSearch() {
     }
 }
 
+/**
+ * Search Suggestions (/api/suggest)
+ */
+function initSuggestions(searchForm, searchInput) {
+    const icons = {project: 'folder-open', tag: 'hashtag', category: 'layer-group'};
+    const cache = new Map();
+    let controller = null;
+    let items = [];
+    let active = -1;
+    
+    searchForm.classList.add('position-relative');
+    searchInput.setAttribute('autocomplete', 'off');
+    const menu = document.createElement('ul');
+    menu.className = 'dropdown-menu w-100';
+    menu.style.top = '100%';
+    menu.setAttribute('role', 'listbox');
+    searchForm.appendChild(menu);
+    
+    function close() {
+        menu.classList.remove('show');
+        active = -1;
+    }
+    
+    function highlight(index) {
+        items.forEach((item, i) => item.classList.toggle('active', i === index));
+        active = index;
+    }
+    
+    function render(suggestions) {
+        menu.innerHTML = '';
+        items = suggestions.map(suggestion => {
+            const li = document.createElement('li');
+            const link = document.createElement('a');
+            link.className = 'dropdown-item';
+            link.href = suggestion.url;
+            link.setAttribute('role', 'option');
+            const icon = document.createElement('i');
+            icon.className = `fas fa-${icons[suggestion.type] || 'search'} me-2 text-muted`;
+            link.appendChild(icon);
+            link.appendChild(document.createTextNode(suggestion.label));
+            li.appendChild(link);
+            menu.appendChild(li);
+            return link;
+        });
+        active = -1;
+        menu.classList.toggle('show', items.length > 0);
+    }
+    
+    const fetchSuggestions = debounce(function(query) {
+        if (cache.has(query)) {
+            render(cache.get(query));
+            return;
+        }
+        // Only the latest keystroke's answer matters
+        if (controller) controller.abort();
+        controller = new AbortController();
+        fetch(`/api/suggest?q=${encodeURIComponent(query)}`, {signal: controller.signal})
+            .then(response => response.json())
+            .then(data => {
+                cache.set(query, data.suggestions);
+                if (searchInput.value.trim() === query) render(data.suggestions);
+            })
+            .catch(() => {});
+    }, 150);
+    
+    searchInput.addEventListener('input', function() {
+        const query = this.value.trim();
+        if (query) {
+            fetchSuggestions(query);
+        } else {
+            close();
+        }
+    });
+    
+    searchInput.addEventListener('keydown', function(e) {
+        if (!menu.classList.contains('show')) return;
+        if (e.key === 'ArrowDown') {
+            e.preventDefault();
+            highlight((active + 1) % items.length);
+        } else if (e.key === 'ArrowUp') {
+            e.preventDefault();
+            highlight((active - 1 + items.length) % items.length);
+        } else if (e.key === 'Enter' && active >= 0) {
+            e.preventDefault();
+            window.location.href = items[active].href;
+        } else if (e.key === 'Escape') {
+            close();
+        }
+    });
+    
+    document.addEventListener('click', function(e) {
+        if (!searchForm.contains(e.target)) close();
+    });
+}
+
 /**
  * Image Lazy Loading
  */
@@ -741,8 +828,56 @@ function copyToClipboard(text) {
     }
 }
 
+/**
+ * Hydration of pre-rendered (frozen) pages
+ *
+ * Frozen pages are rendered for an anonymous visitor and served as static files.
+ * When the login hint cookie is present, the session endpoint fills in the user
+ * menu, like state and comment form (with a fresh CSRF token).
+ */
+function initHydration() {
+    if (document.body.dataset.frozen !== 'true') return;
+    
+    const likeButton = document.querySelector('.like-btn[data-hydrate]');
+    const projectId = likeButton ? likeButton.getAttribute('data-project-id') : null;
+    
+    // Views of frozen project pages never reach the project route
+    if (projectId && navigator.sendBeacon) {
+        navigator.sendBeacon(`/api/v1/projects/${projectId}/views`);
+    }
+    
+    if (!document.cookie.split('; ').some(cookie => cookie.startsWith('portfolio_user='))) return;
+    
+    const url = projectId ? `/api/v1/session?project=${projectId}` : '/api/v1/session';
+    fetch(url, { credentials: 'same-origin' })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.authenticated) return;
+        
+        document.querySelectorAll('[data-hydrate="guest"]').forEach(el => el.classList.add('d-none'));
+        document.querySelectorAll('[data-hydrate="user"]').forEach(el => el.classList.remove('d-none'));
+        if (data.is_admin) {
+            document.querySelectorAll('[data-hydrate="admin"]').forEach(el => el.classList.remove('d-none'));
+        }
+        document.querySelectorAll('[data-hydrate-field="first_name"]').forEach(el => {
+            el.textContent = data.name.split(' ')[0];
+        });
+        
+        if (likeButton) {
+            likeButton.classList.toggle('active', !!data.liked);
+        }
+        document.querySelectorAll('#commentForm input[name="csrf_token"]').forEach(input => {
+            input.value = data.csrf_token;
+        });
+    })
+    .catch(error => {
+        console.error('Error:', error);
+    });
+}
+
 // Initialize additional features after DOM load
 document.addEventListener('DOMContentLoaded', function() {
+    initHydration();
     initLikeSystem();
     initCommentSystem();
     initSearch();
@@ -0,0 +1,384 @@
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from flask import current_app
+from sqlalchemy import event, inspect
+from app import db
+from models import Project, Category, Tag, Like, ProjectViewDay, project_tags
+
+SUGGEST_LIMIT = 8
+MAX_QUERY_LENGTH = 50
+# Prefixes this short match too many keys to rank on every request; their top results are kept ready
+CACHED_PREFIX_LENGTH = 2
+
+VERSION_FILE = 'suggest.version'
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse everything else to single spaces"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return _NON_ALNUM.sub(' ', text).strip()
+
+
+def _keys(label):
+    """Every suffix of the label starting at a word, so "App Web" matches "app" and "web" """
+    words = normalize(label).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+class SuggestIndex:
+    """
+    In-memory prefix index over published project titles, tag names and category names
+
+    Keys live in one sorted list searched with bisect; results are ranked by
+    popularity (likes and views for projects, published project count for tags
+    and categories). Projects are updated one at a time after admin saves.
+    """
+
+    def __init__(self):
+        self.keys = []              # sorted (key, entry id)
+        self.entries = {}           # entry id -> (weight, label)
+        self.projects = {}          # project id -> (title, category id, tag names, weight)
+        self.category_names = {}
+        self.category_counts = Counter()
+        self.tag_counts = Counter()
+        self.top = {}               # short prefix -> top entry ids
+        self.lock = threading.Lock()
+        self.built_at = 0.0
+
+    # Building
+
+    @classmethod
+    def build(cls):
+        """Build from one query over published projects with their category, tags and popularity"""
+        likes = (db.session.query(Like.project_id, db.func.count().label('likes'))
+                 .group_by(Like.project_id).subquery())
+        views = (db.session.query(ProjectViewDay.project_id, db.func.sum(ProjectViewDay.views).label('views'))
+                 .group_by(ProjectViewDay.project_id).subquery())
+        rows = (db.session.query(Project.id, Project.title, Project.is_featured, Category.id, Category.name,
+                                 Tag.name, likes.c.likes, views.c.views)
+                .filter(Project.is_published == True)
+                .outerjoin(Category, Category.id == Project.category_id)
+                .outerjoin(project_tags, project_tags.c.project_id == Project.id)
+                .outerjoin(Tag, Tag.id == project_tags.c.tag_id)
+                .outerjoin(likes, likes.c.project_id == Project.id)
+                .outerjoin(views, views.c.project_id == Project.id))
+
+        projects = {}
+        category_names = {}
+        for project_id, title, featured, category_id, category_name, tag_name, like_count, view_count in rows:
+            if project_id not in projects:
+                projects[project_id] = (title, category_id, set(), _popularity(like_count, view_count, featured))
+            if tag_name:
+                projects[project_id][2].add(tag_name)
+            if category_id:
+                category_names[category_id] = category_name
+        return cls.from_projects(projects, category_names)
+
+    @classmethod
+    def from_projects(cls, projects, category_names):
+        """Index {project id: (title, category id, tag names, weight)}"""
+        index = cls()
+        index.category_names = dict(category_names)
+        keys = []
+        for project_id, project in projects.items():
+            index.projects[project_id] = project
+            index.category_counts[project[1]] += 1
+            index.tag_counts.update(project[2])
+        index.category_counts.pop(None, None)
+        for entry_id, weight, label in index._all_entries():
+            index.entries[entry_id] = (weight, label)
+            keys.extend((key, entry_id) for key in _keys(label))
+        index.keys = sorted(keys)
+        index._refresh_top({key[:length] for key, _ in index.keys for length in range(1, CACHED_PREFIX_LENGTH + 1)})
+        index.built_at = time.time()
+        return index
+
+    def _all_entries(self):
+        for project_id, (title, _, _, weight) in self.projects.items():
+            yield ('project', project_id), weight, title
+        for category_id, count in self.category_counts.items():
+            yield ('category', category_id), count, self.category_names[category_id]
+        for name, count in self.tag_counts.items():
+            yield ('tag', name), count, name
+
+    # Incremental updates
+
+    def _remove_entry(self, entry_id):
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return set()
+        keys = _keys(entry[1])
+        for key in keys:
+            position = bisect.bisect_left(self.keys, (key, entry_id))
+            if position < len(self.keys) and self.keys[position] == (key, entry_id):
+                del self.keys[position]
+        return keys
+
+    def _set_entry(self, entry_id, weight, label):
+        """Insert or replace an entry; returns the keys touched"""
+        keys = self._remove_entry(entry_id)
+        if weight > 0:
+            self.entries[entry_id] = (weight, label)
+            for key in _keys(label):
+                bisect.insort(self.keys, (key, entry_id))
+                keys.add(key)
+        return keys
+
+    def update_project(self, project_id, project=None, category_name=None):
+        """
+        Replace one project's entries after a save
+
+        ``project`` is (title, category id, tag names, weight), or None once the
+        project is deleted or unpublished.
+        """
+        with self.lock:
+            touched = set()
+            old = self.projects.pop(project_id, None)
+            if old is not None:
+                self.category_counts[old[1]] -= 1
+                self.tag_counts.subtract(old[2])
+            if project is not None:
+                self.projects[project_id] = project
+                self.category_counts[project[1]] += 1
+                self.tag_counts.update(project[2])
+                if project[1]:
+                    self.category_names[project[1]] = category_name
+                touched |= self._set_entry(('project', project_id), project[3], project[0])
+            else:
+                touched |= self._remove_entry(('project', project_id))
+
+            for category_id in {old[1] if old else None, project[1] if project else None} - {None}:
+                touched |= self._set_entry(('category', category_id), self.category_counts[category_id],
+                                           self.category_names.get(category_id, ''))
+            for name in (old[2] if old else set()) | (project[2] if project else set()):
+                touched |= self._set_entry(('tag', name), self.tag_counts[name], name)
+            self.category_counts += Counter()    # drop zero counts
+            self.tag_counts += Counter()
+
+            changed = {('project', project_id)}
+            changed |= {('category', category_id) for category_id in
+                        {old[1] if old else None, project[1] if project else None} - {None}}
+            changed |= {('tag', name) for name in (old[2] if old else set()) | (project[2] if project else set())}
+            self._refresh_top({key[:length] for key in touched for length in range(1, CACHED_PREFIX_LENGTH + 1)},
+                              changed)
+
+    # Lookups
+
+    def _rank(self, prefix, limit):
+        """Top entry ids for a prefix, scanning every key that starts with it"""
+        start = bisect.bisect_left(self.keys, (prefix,))
+        end = bisect.bisect_left(self.keys, (prefix + '\uffff',), start)
+        best = {}
+        for _, entry_id in self.keys[start:end]:
+            best[entry_id] = self.entries[entry_id][0]
+        return heapq.nlargest(limit, best, key=best.__getitem__)
+
+    def _refresh_top(self, prefixes, changed=None):
+        """Recompute the cached top entries of short prefixes, skipping those a change cannot affect"""
+        for prefix in prefixes:
+            if len(prefix) > CACHED_PREFIX_LENGTH:
+                continue
+            top = self.top.get(prefix, [])
+            if changed is not None and len(top) == SUGGEST_LIMIT and not changed.intersection(top):
+                # Only an entry that now outranks the last one shown can enter the list
+                lowest = self.entries[top[-1]][0]
+                if all(self.entries.get(entry_id, (0,))[0] <= lowest for entry_id in changed):
+                    continue
+            top = self._rank(prefix, SUGGEST_LIMIT)
+            if top:
+                self.top[prefix] = top
+            else:
+                self.top.pop(prefix, None)
+
+    def search(self, query, limit=SUGGEST_LIMIT):
+        """[(entry id, label)] best matches for the start of any word of a label"""
+        prefix = normalize(query)[:MAX_QUERY_LENGTH]
+        if not prefix:
+            return []
+        with self.lock:
+            if len(prefix) <= CACHED_PREFIX_LENGTH and limit <= SUGGEST_LIMIT:
+                entry_ids = self.top.get(prefix, [])[:limit]
+            else:
+                entry_ids = self._rank(prefix, limit)
+            return [(entry_id, self.entries[entry_id][1]) for entry_id in entry_ids]
+
+
+def _popularity(likes, views, featured):
+    """Likes count most; views are log-damped so one viral project does not bury the rest"""
+    return 1 + (likes or 0) * 3 + math.log1p(views or 0) + (5 if featured else 0)
+
+
+def _load_project(project_id):
+    """Index state of one project, or None if it is not published"""
+    project = Project.query.filter_by(id=project_id, is_published=True).first()
+    if project is None:
+        return None, None
+    likes = db.session.query(db.func.count(Like.id)).filter(Like.project_id == project_id).scalar()
+    views = db.session.query(db.func.sum(ProjectViewDay.views)).filter(ProjectViewDay.project_id == project_id).scalar()
+    state = (project.title, project.category_id, {tag.name for tag in project.tags},
+             _popularity(likes, views, project.is_featured))
+    return state, project.category.name if project.category else None
+
+
+class Suggestions:
+    """
+    The worker's SuggestIndex, kept current across workers
+
+    Commits that change projects bump a shared version file. The committing
+    worker applies the changed projects to its index in place on its next
+    lookup; other workers see the newer version (one stat per lookup) and
+    rebuild in the background while the old index keeps answering. So does any
+    worker whose index is older than max_age, which folds in new likes and views.
+    """
+
+    def __init__(self, app, version_path, max_age=600.0):
+        self.app = app
+        self.version_path = version_path
+        self.max_age = max_age
+        self.index = None
+        self.version = None
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.rebuilding = threading.Lock()
+
+    def _shared_version(self):
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _rebuild(self):
+        try:
+            version = self._shared_version()
+            with self.app.app_context():
+                index = SuggestIndex.build()
+            with self.lock:
+                # Changes committed here while building are in the new index already
+                self.index, self.version = index, version
+                self.pending.clear()
+        except Exception as e:
+            self.app.logger.error("Failed to rebuild the suggestion index: %s", e)
+        finally:
+            self.rebuilding.release()
+
+    def build(self):
+        """Build the index synchronously (at startup, or on first use if that failed)"""
+        with self.lock:
+            self.version = self._shared_version()
+            self.pending.clear()
+            self.index = SuggestIndex.build()
+
+    def current(self):
+        """The index to answer with, starting a background rebuild if it is stale"""
+        if self.index is None:
+            self.build()
+            return self.index
+
+        if self.pending:
+            with self.lock:
+                project_ids, self.pending = self.pending, set()
+                for project_id in project_ids:
+                    state, category_name = _load_project(project_id)
+                    self.index.update_project(project_id, state, category_name)
+
+        if (self.version != self._shared_version() or time.time() - self.index.built_at > self.max_age) \
+                and self.rebuilding.acquire(blocking=False):
+            threading.Thread(target=self._rebuild, name='suggest-rebuild', daemon=True).start()
+        return self.index
+
+    def _bump_version(self):
+        os.makedirs(os.path.dirname(self.version_path), exist_ok=True)
+        with open(self.version_path, 'a'):
+            os.utime(self.version_path)
+
+    def invalidate(self):
+        """Make every worker, this one included, rebuild its index on its next lookup"""
+        with self.lock:
+            self._bump_version()
+
+    def projects_changed(self, project_ids):
+        """Record committed project changes (no SQL: called from after_commit)"""
+        with self.lock:
+            up_to_date = self.version == self._shared_version()
+            self._bump_version()
+            if self.index is not None:
+                self.pending.update(project_ids)
+                # This worker applies the change itself; only other workers need to rebuild
+                if up_to_date:
+                    self.version = self._shared_version()
+
+
+def suggest(query, limit=SUGGEST_LIMIT):
+    """Suggestions for a search box prefix: [(entry id, label)]"""
+    return current_app.extensions['suggestions'].current().search(query, limit)
+
+
+def invalidate_suggestions():
+    """Rebuild the index everywhere after writes made outside the ORM session (e.g. imports)"""
+    suggestions = current_app.extensions.get('suggestions')
+    if suggestions is not None:
+        suggestions.invalidate()
+
+
+def _track_changes(session, flush_context):
+    """Projects whose title, publication, category or tags changed in this flush"""
+    changed = session.info.setdefault('suggest_projects', set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Project):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if not isinstance(obj, Project):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes()
+               for name in ('title', 'is_published', 'is_featured', 'category_id', 'tags')):
+            changed.add(obj.id)
+
+
+def _track_bulk_changes(orm_execute_state):
+    """Bulk statements from bulk_actions pass their project ids as an execution option"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        project_ids = orm_execute_state.execution_options.get('project_ids')
+        if project_ids:
+            orm_execute_state.session.info.setdefault('suggest_projects', set()).update(project_ids)
+
+
+def init_suggest(app):
+    """Attach the suggestion index to the app and update it after project saves"""
+    suggestions = Suggestions(
+        app,
+        os.path.join(app.instance_path, VERSION_FILE),
+        max_age=app.config.get('SUGGEST_MAX_AGE', 600.0),
+    )
+    app.extensions['suggestions'] = suggestions
+
+    session_class = db.session.session_factory.class_
+    event.listen(session_class, 'after_flush', _track_changes)
+    event.listen(session_class, 'do_orm_execute', _track_bulk_changes)
+
+    # Forked gunicorn workers inherit the index built here
+    with app.app_context():
+        try:
+            suggestions.build()
+        except Exception as e:
+            app.logger.warning("Suggestion index not built at startup: %s", e)
+
+    @event.listens_for(session_class, 'after_commit')
+    def update_after_commit(session):
+        project_ids = session.info.pop('suggest_projects', None)
+        if project_ids:
+            suggestions.projects_changed(project_ids)
+
+    @event.listens_for(session_class, 'after_rollback')
+    def discard_changes(session):
+        session.info.pop('suggest_projects', None)
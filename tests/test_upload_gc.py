@@ -0,0 +1,44 @@
+import os
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+os.environ.setdefault('RATELIMIT_STORAGE', 'memory')
+
+from app import app
+from upload_gc import CHUNKED_DIR, collect_garbage
+
+GRACE = 3600
+
+
+def _make_session(upload_dir, upload_id, age):
+    """A chunked upload session whose files were all last written ``age`` seconds ago"""
+    session_dir = os.path.join(upload_dir, CHUNKED_DIR, upload_id)
+    os.makedirs(os.path.join(session_dir, 'chunks'))
+    for name in ('meta.json', 'data'):
+        with open(os.path.join(session_dir, name), 'w') as f:
+            f.write('x')
+    then = time.time() - age
+    for path in (os.path.join(session_dir, 'meta.json'), os.path.join(session_dir, 'data'),
+                 os.path.join(session_dir, 'chunks'), session_dir):
+        os.utime(path, (then, then))
+    return session_dir
+
+
+def test_abandoned_session_is_removed(tmp_path):
+    session_dir = _make_session(str(tmp_path), 'a' * 32, age=2 * GRACE)
+    with app.app_context():
+        report = collect_garbage(str(tmp_path), set(), GRACE)
+    assert report['abandoned_sessions'] == 1
+    assert not os.path.exists(session_dir)
+
+
+def test_old_session_receiving_chunks_survives(tmp_path):
+    session_dir = _make_session(str(tmp_path), 'b' * 32, age=2 * GRACE)
+    # A chunk arriving now: the data file is rewritten and its marker added
+    os.utime(os.path.join(session_dir, 'data'))
+    open(os.path.join(session_dir, 'chunks', '3'), 'w').close()
+    with app.app_context():
+        report = collect_garbage(str(tmp_path), set(), GRACE)
+    assert report['abandoned_sessions'] == 0
+    assert os.path.isdir(session_dir)
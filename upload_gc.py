@@ -0,0 +1,151 @@
+import os
+import shutil
+import time
+from collections import defaultdict
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import or_, select
+from app import db
+from models import UPLOAD_FILE_COLUMNS
+
+uploads_cli = AppGroup('uploads', help='Maintenance of the upload folder.')
+
+QUARANTINE_DIR = '.quarantine'
+CHUNKED_DIR = '.chunked'
+
+
+def referenced_uploads():
+    """Set of filenames referenced by any upload column, one streamed query per table"""
+    columns_by_table = defaultdict(list)
+    for column in UPLOAD_FILE_COLUMNS:
+        columns_by_table[column.table].append(column)
+
+    referenced = set()
+    with db.engine.connect() as connection:
+        for columns in columns_by_table.values():
+            statement = select(*columns).where(or_(*[column.isnot(None) for column in columns]))
+            result = connection.execution_options(stream_results=True, yield_per=5000).execute(statement)
+            for row in result:
+                referenced.update(filename for filename in row if filename)
+    return referenced
+
+
+def _chunked_sessions(upload_dir):
+    """Ids of chunked upload sessions still in progress or waiting to be attached"""
+    path = os.path.join(upload_dir, CHUNKED_DIR)
+    if not os.path.isdir(path):
+        return set()
+    with os.scandir(path) as entries:
+        return {entry.name for entry in entries if entry.is_dir()}
+
+
+def _session_activity(session_dir):
+    """
+    Time of the last write to a chunked upload session
+
+    Each accepted chunk rewrites the data file and adds a marker to chunks/, so
+    an upload still receiving chunks stays active however old meta.json is.
+    """
+    times = []
+    for path in (session_dir, os.path.join(session_dir, 'meta.json'),
+                 os.path.join(session_dir, 'data'), os.path.join(session_dir, 'chunks')):
+        try:
+            times.append(os.stat(path).st_mtime)
+        except OSError:
+            pass
+    return max(times, default=0)
+
+
+def collect_garbage(upload_dir, referenced, grace_seconds, dry_run=False):
+    """
+    Quarantine unreferenced uploads, then delete those quarantined for a full grace period
+
+    Files younger than the grace period are left alone so uploads whose database
+    row is not committed yet survive. Quarantined files that are referenced again
+    (e.g. after a content import) are moved back. Chunked upload sessions idle
+    for longer than the grace period are removed.
+    """
+    now = time.time()
+    quarantine_dir = os.path.join(upload_dir, QUARANTINE_DIR)
+    sessions = _chunked_sessions(upload_dir)
+    report = defaultdict(int)
+
+    if not dry_run:
+        os.makedirs(quarantine_dir, exist_ok=True)
+
+    # Phase 1: move orphans into quarantine (streamed, entries are never listed in full)
+    with os.scandir(upload_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                continue
+            report['scanned'] += 1
+            if entry.name in referenced or os.path.splitext(entry.name)[0] in sessions:
+                continue
+
+            stat = entry.stat(follow_symlinks=False)
+            if now - stat.st_mtime < grace_seconds:
+                continue
+
+            report['quarantined'] += 1
+            report['quarantined_bytes'] += stat.st_size
+            if not dry_run:
+                target = os.path.join(quarantine_dir, entry.name)
+                os.replace(entry.path, target)
+                # The mtime now records when the file entered quarantine
+                os.utime(target, (now, now))
+
+    # Phase 2: restore files referenced again, delete files past their quarantine period
+    if os.path.isdir(quarantine_dir):
+        with os.scandir(quarantine_dir) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if entry.name in referenced:
+                    report['restored'] += 1
+                    if not dry_run:
+                        os.replace(entry.path, os.path.join(upload_dir, entry.name))
+                    continue
+
+                stat = entry.stat(follow_symlinks=False)
+                if now - stat.st_mtime < grace_seconds:
+                    continue
+
+                report['deleted'] += 1
+                report['reclaimed_bytes'] += stat.st_size
+                if not dry_run:
+                    try:
+                        os.remove(entry.path)
+                    except OSError as e:
+                        current_app.logger.error("Error deleting quarantined upload %s: %s", entry.name, e)
+
+    # Abandoned chunked upload sessions
+    for upload_id in sessions:
+        session_dir = os.path.join(upload_dir, CHUNKED_DIR, upload_id)
+        if now - _session_activity(session_dir) < grace_seconds:
+            continue
+        size = sum(entry.stat().st_size for entry in os.scandir(session_dir) if entry.is_file())
+        report['abandoned_sessions'] += 1
+        report['reclaimed_bytes'] += size
+        if not dry_run:
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+    return report
+
+
+@uploads_cli.command('gc')
+@click.option('--grace-hours', default=24.0, show_default=True,
+              help='Minimum age before a file is quarantined, and time spent in quarantine before deletion.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be done.')
+def gc_command(grace_hours, dry_run):
+    """Quarantine and later delete uploads no database row references."""
+    upload_dir = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+    referenced = referenced_uploads()
+    report = collect_garbage(upload_dir, referenced, grace_hours * 3600, dry_run=dry_run)
+
+    prefix = '[dry run] ' if dry_run else ''
+    click.echo(f"{prefix}scanned {report['scanned']} files, {len(referenced)} referenced")
+    click.echo(f"{prefix}quarantined {report['quarantined']} files ({report['quarantined_bytes']} bytes)")
+    click.echo(f"{prefix}restored {report['restored']} files referenced again")
+    click.echo(f"{prefix}deleted {report['deleted']} files and {report['abandoned_sessions']} "
+               f"abandoned chunked uploads, reclaimed {report['reclaimed_bytes']} bytes")
@@ -1,4 +1,5 @@
 import os
+import time
 import uuid
 import smtplib
 from email.mime.text import MIMEText
@@ -6,12 +7,83 @@ from email.mime.multipart import MIMEMultipart
 from PIL import Image
 from flask import current_app
 from werkzeug.utils import secure_filename
+from metrics import inc, observe
 
 def allowed_file(filename, extensions):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in extensions
 
+# Decoders allowed for uploaded images
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+def ingest_image(source, file_path, max_size=(1200, 1200), max_bytes=16 * 1024 * 1024,
+                 max_pixels=50_000_000, max_decode_bytes=128 * 1024 * 1024):
+    """
+    Resize an uploaded image into file_path with bounded memory
+    
+    Only the header is read before the budgets are checked, so oversized or
+    decompression-bomb images are rejected without being decoded. JPEGs are
+    decoded directly at 1/2, 1/4 or 1/8 scale (draft mode), which keeps a 40 MP
+    photo at about 1800x1400 instead of its full 7300x5500.
+    
+    Args:
+        source: Seekable binary file object with the upload
+        file_path: Where to write the resized image (format from its extension)
+        max_size: Maximum image dimensions (width, height)
+        max_bytes: Maximum size of the encoded upload
+        max_pixels: Maximum width * height declared in the header
+        max_decode_bytes: Maximum size of the decoded pixel buffer
+    
+    Returns:
+        Dict with the source size, decoded size and decoded bytes
+    
+    Raises:
+        ValueError: If the image exceeds a budget
+    """
+    source.seek(0, os.SEEK_END)
+    size_bytes = source.tell()
+    source.seek(0)
+    if size_bytes > max_bytes:
+        raise ValueError(f"image is {size_bytes} bytes, limit is {max_bytes}")
+    
+    with Image.open(source, formats=IMAGE_FORMATS) as img:
+        width, height = img.size
+        if width * height > max_pixels:
+            raise ValueError(f"image is {width}x{height}, limit is {max_pixels} pixels")
+        
+        # Scale during decode to the smallest DCT scale that still covers max_size
+        img.draft(None, max_size)
+        
+        # Pillow stores multi-band pixels in 4 bytes (RGB is padded)
+        pixel_bytes = 1 if img.mode in ('1', 'L', 'P') else 4
+        decoded_bytes = img.size[0] * img.size[1] * pixel_bytes
+        if decoded_bytes > max_decode_bytes:
+            raise ValueError(f"decoding {img.size[0]}x{img.size[1]} {img.mode} needs {decoded_bytes} bytes, "
+                             f"limit is {max_decode_bytes}")
+        decoded_size = img.size
+        
+        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        
+        # JPEG has no alpha or palette; flatten on white (after resizing, on the small image)
+        if os.path.splitext(file_path)[1].lower() in {'.jpg', '.jpeg'} and img.mode not in ('RGB', 'L'):
+            if img.mode in ('RGBA', 'LA', 'P'):
+                img = img.convert('RGBA')
+                rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+                rgb_img.paste(img, mask=img.split()[-1])
+                img = rgb_img
+            else:
+                img = img.convert('RGB')
+        
+        img.save(file_path, optimize=True, quality=85)
+    
+    return {
+        'source_size': (width, height),
+        'decoded_size': decoded_size,
+        'decoded_bytes': decoded_bytes,
+    }
+
 def save_uploaded_file(file, folder='uploads', max_size=(1200, 1200)):
     """
     Save uploaded file with unique filename and resize if it's an image
@@ -38,23 +110,25 @@ def save_uploaded_file(file, folder='uploads', max_size=(1200, 1200)):
     
     file_path = os.path.join(upload_dir, unique_filename)
     
+    start = time.perf_counter()
     try:
-        # Save the file
-        file.save(file_path)
-        
-        # If it's an image, resize it
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
-        if ext.lower() in image_extensions:
-            with Image.open(file_path) as img:
-                # Convert RGBA to RGB if necessary
-                if img.mode == 'RGBA' and ext.lower() in {'.jpg', '.jpeg'}:
-                    rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-                    rgb_img.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = rgb_img
-                
-                # Resize if larger than max_size
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                img.save(file_path, optimize=True, quality=85)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            # Resize straight from the upload stream instead of saving and re-reading it
+            stats = ingest_image(
+                file.stream, file_path, max_size,
+                max_bytes=current_app.config.get('IMAGE_MAX_BYTES', 16 * 1024 * 1024),
+                max_pixels=current_app.config.get('IMAGE_MAX_PIXELS', 50_000_000),
+                max_decode_bytes=current_app.config.get('IMAGE_MAX_DECODE_BYTES', 128 * 1024 * 1024),
+            )
+            current_app.logger.debug(
+                "Image %s: %dx%d decoded at %dx%d (%.1f MB) in %.0f ms",
+                unique_filename, *stats['source_size'], *stats['decoded_size'],
+                stats['decoded_bytes'] / (1024 * 1024), (time.perf_counter() - start) * 1000
+            )
+            observe('upload_processing_seconds', time.perf_counter() - start, (('kind', 'image'),))
+        else:
+            file.save(file_path)
+            observe('upload_processing_seconds', time.perf_counter() - start, (('kind', 'file'),))
         
         return unique_filename
     
@@ -62,7 +136,7 @@ def save_uploaded_file(file, folder='uploads', max_size=(1200, 1200)):
         # Remove file if processing failed
         if os.path.exists(file_path):
             os.remove(file_path)
-        current_app.logger.error(f"Error saving file: {e}")
+        current_app.logger.error("Error saving file: %s", e)
         return None
 
 def delete_file(filename, folder='uploads'):
@@ -77,7 +151,7 @@ def delete_file(filename, folder='uploads'):
             os.remove(file_path)
             return True
     except Exception as e:
-        current_app.logger.error(f"Error deleting file: {e}")
+        current_app.logger.error("Error deleting file: %s", e)
     
     return False
 
@@ -130,6 +204,7 @@ def send_contact_email(name, email, subject, message):
     admin_email = os.environ.get('ADMIN_EMAIL')
     
     if not all([smtp_server, smtp_username, smtp_password, admin_email]):
+        inc('smtp_sends_total', (('outcome', 'not_configured'),))
         raise ValueError("Email configuration incomplete. Please set SMTP environment variables.")
     
     # Create message
@@ -165,8 +240,10 @@ Para responder, utilize o email: {email}
         server.sendmail(smtp_username, admin_email, text)
         server.quit()
         
-        current_app.logger.info(f"Contact email sent successfully from {email}")
+        current_app.logger.info("Contact email sent successfully from %s", email)
+        inc('smtp_sends_total', (('outcome', 'sent'),))
         
     except Exception as e:
-        current_app.logger.error(f"Failed to send contact email: {e}")
+        current_app.logger.error("Failed to send contact email: %s", e)
+        inc('smtp_sends_total', (('outcome', 'failed'),))
         raise
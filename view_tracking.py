@@ -0,0 +1,162 @@
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app, request
+from flask_login import current_user
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from models import Project, ProjectViewDay
+
+UPSERTS = {
+    'postgresql': postgresql_insert,
+    'sqlite': sqlite_insert,
+}
+
+
+class ViewCounter:
+    """
+    Write-behind project view counter
+
+    Views are counted in memory per worker, deduplicated per visitor within a
+    window, and flushed as aggregated per-day deltas in one batched transaction
+    every flush interval and at shutdown. Nothing touches the database on the
+    request path.
+    """
+
+    def __init__(self, app, flush_interval=10.0, dedup_window=1800.0):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.dedup_window = dedup_window
+        self._pending = defaultdict(int)   # (project_id, day) -> views
+        self._seen = {}                    # (visitor, project_id) -> expiry
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+
+    def record(self, project_id, visitor):
+        """Count a view unless this visitor already viewed the project recently"""
+        now = time.monotonic()
+        key = (visitor, project_id)
+        with self._lock:
+            if self._seen.get(key, 0) > now:
+                return False
+            self._seen[key] = now + self.dedup_window
+            self._pending[(project_id, datetime.utcnow().date())] += 1
+
+        # Started lazily so each forked gunicorn worker gets its own flusher
+        if self._pid != os.getpid():
+            self._start()
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+        thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.app.logger.error("Failed to flush project views: %s", e)
+
+    def flush(self):
+        """Write the buffered deltas; returns the number of views written"""
+        now = time.monotonic()
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            self._seen = {key: expiry for key, expiry in self._seen.items() if expiry > now}
+
+        if not pending:
+            return 0
+
+        with self.app.app_context():
+            try:
+                _write_deltas(pending)
+            except Exception:
+                # Put the deltas back so the next flush retries them
+                with self._lock:
+                    for key, views in pending.items():
+                        self._pending[key] += views
+                raise
+
+        return sum(pending.values())
+
+    def stop(self):
+        """Stop the flusher and write what is still buffered (registered to run at exit)"""
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            self.app.logger.error("Failed to flush project views at shutdown: %s", e)
+
+
+def _write_deltas(pending):
+    """Add the per-day deltas to project_view_days in one transaction"""
+    table = ProjectViewDay.__table__
+    project_ids = {project_id for project_id, _ in pending}
+
+    # Projects deleted since the view would violate the foreign key
+    with db.engine.connect() as connection:
+        existing = set(connection.execute(
+            select(Project.id).where(Project.id.in_(project_ids))
+        ).scalars())
+
+    rows = [
+        {'project_id': project_id, 'day': day, 'views': views}
+        for (project_id, day), views in pending.items() if project_id in existing
+    ]
+    if not rows:
+        return
+
+    with db.engine.begin() as connection:
+        upsert = UPSERTS.get(connection.dialect.name)
+        if upsert is not None:
+            statement = upsert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.project_id, table.c.day],
+                set_={'views': table.c.views + statement.excluded.views},
+            )
+            connection.execute(statement, rows)
+            return
+
+        for row in rows:
+            updated = connection.execute(
+                table.update()
+                .where(table.c.project_id == row['project_id'], table.c.day == row['day'])
+                .values(views=table.c.views + row['views'])
+            ).rowcount
+            if not updated:
+                connection.execute(table.insert(), row)
+
+
+def _visitor_key():
+    """Identify the visitor without setting a cookie"""
+    if current_user.is_authenticated:
+        return ('user', current_user.id)
+    return ('anon', hash((request.remote_addr, request.user_agent.string)))
+
+
+def record_view(project_id):
+    """Count a view of a project for the current request"""
+    counter = current_app.extensions.get('view_counter')
+    if counter is not None:
+        counter.record(project_id, _visitor_key())
+
+
+def init_view_tracking(app):
+    """Attach a ViewCounter to the app"""
+    app.extensions['view_counter'] = ViewCounter(
+        app,
+        flush_interval=app.config.get('VIEW_FLUSH_INTERVAL', 10.0),
+        dedup_window=app.config.get('VIEW_DEDUP_WINDOW', 1800.0),
+    )